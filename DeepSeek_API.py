@@ -1,3 +1,4 @@
+import io
 import os
 import requests
 import json
@@ -12,7 +13,7 @@ OUTPUT_DOCX_FILE = 'generated_bankruptcy_statement.docx'
 
 # --- DeepSeek API Конфигурация ---
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")  # Можно указать локальную заглушку
 DEFAULT_DEEPSEEK_MODEL = "deepseek-chat"
 DEEPSEEK_CODER_MODEL = "deepseek-coder"  # Для задач, требующих структурированного вывода (JSON)
 
@@ -100,14 +101,24 @@ def call_deepseek_api(prompt_messages,
                       model=DEFAULT_DEEPSEEK_MODEL,
                       temperature=0.5,
                       max_tokens=1024,
-                      stream=False):
-    if not DEEPSEEK_API_KEY:
+                      stream=False,
+                      session=None,
+                      api_url=None,
+                      api_key=None):
+    """
+    Вызывает DeepSeek Chat Completions API.
+    session (requests.Session) позволяет переиспользовать HTTP-соединение между вызовами,
+    api_url и api_key переопределяют значения из переменных окружения (например, для локальной заглушки).
+    """
+    api_url = api_url or DEEPSEEK_API_URL
+    api_key = api_key or DEEPSEEK_API_KEY
+    if not api_key:
         print("Критическая ошибка: API ключ DeepSeek (DEEPSEEK_API_KEY) не найден в переменных окружения.")
         return None
 
     headers = {
         "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
+        "Authorization": f"Bearer {api_key}"
     }
     payload = {
         "model": model,
@@ -118,7 +129,8 @@ def call_deepseek_api(prompt_messages,
     }
 
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=90, stream=stream)
+        http = session or requests
+        response = http.post(api_url, headers=headers, json=payload, timeout=90, stream=stream)
         response.raise_for_status()
 
         if stream:
@@ -171,8 +183,11 @@ def call_deepseek_api(prompt_messages,
         return None
 
 
-def enhance_client_data_with_deepseek(client_data):
-    """Обогащает данные клиента, используя DeepSeek."""
+def enhance_client_data_with_deepseek(client_data, session=None, stream=True, api_url=None, api_key=None):
+    """
+    Обогащает данные клиента, используя DeepSeek.
+    session, api_url и api_key передаются в call_deepseek_api; stream=False отключает потоковый вывод в консоль.
+    """
     print("\n--- Обогащение данных с помощью DeepSeek API ---")
 
     # Пример 1: Генерация описания причин банкротства
@@ -183,7 +198,8 @@ def enhance_client_data_with_deepseek(client_data):
          "content": f"Данные клиента:\nСтатус занятости: {client_data.get('employment_status', 'не указан')}\nПоследнее место работы: {client_data.get('last_work_place', 'не указано')}, уволен: {client_data.get('last_work_dismissal_date', 'не указана')}\nОбщая сумма долга: {client_data.get('total_debt_amount', 0):.2f} руб.\nКоличество кредиторов: {len(client_data.get('creditors', []))}.\nДоходы за последние 6 месяцев: {client_data.get('income_last_6_months', 'не указаны')}.\n\nСформулируй краткое описание причин неплатежеспособности."}
     ]
     print("Запрос к DeepSeek для описания причин неплатежеспособности...")
-    bankruptcy_reasons = call_deepseek_api(reasons_prompt, temperature=0.3, max_tokens=250, stream=True)
+    bankruptcy_reasons = call_deepseek_api(reasons_prompt, temperature=0.3, max_tokens=250, stream=stream,
+                                           session=session, api_url=api_url, api_key=api_key)
     if bankruptcy_reasons:
         client_data['bankruptcy_reasons_ai_generated'] = bankruptcy_reasons
     else:
@@ -200,7 +216,8 @@ def enhance_client_data_with_deepseek(client_data):
         ]
         print("\nЗапрос к DeepSeek для анализа заметок клиента...")
         extracted_notes_info = call_deepseek_api(property_extraction_prompt, model=DEFAULT_DEEPSEEK_MODEL,
-                                                 temperature=0.2, max_tokens=300, stream=False)
+                                                 temperature=0.2, max_tokens=300, stream=False,
+                                                 session=session, api_url=api_url, api_key=api_key)
         if extracted_notes_info:
             client_data['additional_info_from_notes_ai'] = extracted_notes_info
         else:
@@ -210,6 +227,14 @@ def enhance_client_data_with_deepseek(client_data):
     return client_data
 
 
+def set_default_ai_fields(client_data):
+    """Добавляет пустые поля ИИ, чтобы шаблон не ломался, если ИИ не использовался."""
+    client_data.setdefault('bankruptcy_reasons_ai_generated',
+                           'Причины неплатежеспособности не были автоматически сгенерированы.')
+    client_data.setdefault('additional_info_from_notes_ai', '')
+    return client_data
+
+
 # --- 3. Создание шаблона DOCX (если его нет) ---
 def create_template_if_not_exists(filename=TEMPLATE_DOCX_FILE):
     """Создает простой DOCX шаблон, если он не существует."""
@@ -218,6 +243,16 @@ def create_template_if_not_exists(filename=TEMPLATE_DOCX_FILE):
         return
 
     print(f"Создание файла шаблона {filename}...")
+    doc = build_template_document()
+    try:
+        doc.save(filename)
+        print(f"Файл шаблона {filename} успешно создан.")
+    except Exception as e:
+        print(f"Ошибка при сохранении файла шаблона {filename}: {e}")
+
+
+def build_template_document():
+    """Собирает простой DOCX шаблон в памяти и возвращает объект Document."""
     doc = Document()
     # Заголовок
     doc.add_heading('В Арбитражный суд {{ court_name | default("_________________________") }}',
@@ -304,12 +339,7 @@ def create_template_if_not_exists(filename=TEMPLATE_DOCX_FILE):
         '3. Документ о внесении на депозит суда средств на выплату вознаграждения фин. управляющему (25000 руб.).\n')
 
     doc.add_paragraph('Дата: «___»___________ 20___ г.         Подпись: _________________ /{{ fio }}/')
-
-    try:
-        doc.save(filename)
-        print(f"Файл шаблона {filename} успешно создан.")
-    except Exception as e:
-        print(f"Ошибка при сохранении файла шаблона {filename}: {e}")
+    return doc
 
 
 # --- 4. Генерация документа ---
@@ -320,7 +350,18 @@ def generate_statement_from_template(client_data, template_path, output_path):
         return
 
     tpl = DocxTemplate(template_path)
+    context = build_template_context(client_data)
 
+    try:
+        tpl.render(context)
+        tpl.save(output_path)
+        print(f"Заявление успешно сгенерировано и сохранено в: {output_path}")
+    except Exception as e:
+        print(f"Ошибка при генерации документа из шаблона: {e}")
+
+
+def build_template_context(client_data):
+    """Готовит контекст для шаблона: копия данных клиента плюс значения по умолчанию."""
     # Дополнительные данные, которые могут понадобиться в шаблоне, но нет в client_data
     # Например, имя суда можно запросить у пользователя или взять из настроек
     context = client_data.copy()  # Работаем с копией
@@ -328,13 +369,18 @@ def generate_statement_from_template(client_data, template_path, output_path):
         context['court_name'] = "Арбитражный суд Свердловской области"  # Пример
     if 'court_address' not in context:
         context['court_address'] = "620075, г. Екатеринбург, ул. Шарташская, д. 4"  # Пример
+    return context
 
-    try:
-        tpl.render(context)
-        tpl.save(output_path)
-        print(f"Заявление успешно сгенерировано и сохранено в: {output_path}")
-    except Exception as e:
-        print(f"Ошибка при генерации документа из шаблона: {e}")
+
+def render_statement_to_bytes(client_data, tpl):
+    """
+    Рендерит заявление из уже загруженного шаблона (DocxTemplate) и возвращает DOCX в виде bytes.
+    Временные файлы не создаются.
+    """
+    tpl.render(build_template_context(client_data))
+    output = io.BytesIO()
+    tpl.save(output)
+    return output.getvalue()
 
 
 # --- Основной блок ---
@@ -353,10 +399,7 @@ if __name__ == "__main__":
         # print(json.dumps(client_data, indent=2, ensure_ascii=False)) # Для отладки
     else:
         print("\nAPI ключ DeepSeek не настроен. Пропускаем шаг обогащения данных с помощью ИИ.")
-        # Добавим пустые поля, чтобы шаблон не ломался, если ИИ не использовался
-        client_data.setdefault('bankruptcy_reasons_ai_generated',
-                               'Причины неплатежеспособности не были автоматически сгенерированы.')
-        client_data.setdefault('additional_info_from_notes_ai', '')
+        set_default_ai_fields(client_data)
 
     # 3. Создаем шаблон DOCX, если его нет
     create_template_if_not_exists(TEMPLATE_DOCX_FILE)
@@ -0,0 +1,410 @@
+import io
+import os
+import json
+import time
+import queue
+import base64
+import binascii
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from docxtpl import DocxTemplate
+from jinja2 import UndefinedError  # Шаблон ссылается на поле, которого нет в client_data
+
+from DeepSeek_API import (
+    DEEPSEEK_API_KEY,
+    DEEPSEEK_API_URL,
+    TEMPLATE_DOCX_FILE,
+    build_template_document,
+    enhance_client_data_with_deepseek,
+    render_statement_to_bytes,
+    set_default_ai_fields,
+)
+from document_formation import (
+    DEFAULT_OCR_MODE,
+    OCR_MODE_ADAPTIVE,
+    OCR_MODE_SINGLE,
+    process_document,
+    warn_if_pdf_rendering_unavailable,
+)
+from ocr_dedup import OcrDedupIndex
+
+# --- Конфигурация сервиса ---
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 16  # Сколько заявок может ждать в очереди, прежде чем сервис начнет отказывать (503)
+REQUEST_TIMEOUT = 180  # Сколько секунд HTTP-обработчик ждет результата от воркера
+MAX_BODY_BYTES = 50 * 1024 * 1024  # Ограничение размера запроса (документы передаются в base64)
+RETRY_AFTER_SECONDS = 5
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+# --- Загрузка шаблона в память ---
+def load_template_bytes(template_path=TEMPLATE_DOCX_FILE):
+    """Читает шаблон с диска или, если его нет, собирает шаблон по умолчанию в памяти."""
+    if os.path.exists(template_path):
+        with open(template_path, 'rb') as f:
+            print(f"Шаблон загружен из {template_path}")
+            return f.read()
+    print(f"Файл шаблона {template_path} не найден. Используется шаблон по умолчанию (в памяти).")
+    output = io.BytesIO()
+    build_template_document().save(output)
+    return output.getvalue()
+
+
+def merge_extracted_data(client_data, extracted_documents):
+    """
+    Дополняет данные клиента сущностями, извлеченными из загруженных документов.
+    Значения из JSON клиента имеют приоритет над извлеченными.
+    """
+    for document in extracted_documents:
+        for key, value in document.get("structured_data", {}).items():
+            if isinstance(value, str) and value:
+                client_data.setdefault(key, value)
+    return client_data
+
+
+def document_error(extracted):
+    """Возвращает текст ошибки извлечения документа или None (экстракторы сообщают об ошибке текстом)."""
+    if extracted.get("error"):
+        return extracted["error"]
+    content = extracted.get("content")
+    if isinstance(content, str) and content.startswith(("Ошибка", "Не удалось")):
+        return content
+    if isinstance(content, dict) and content.get("error"):
+        return content["error"]
+    return None
+
+
+# --- Сервис генерации заявлений ---
+class RenderService:
+    """
+    Пул прогретых воркеров для генерации заявлений.
+    Каждый воркер держит в памяти загруженный шаблон и собственную HTTP-сессию к LLM,
+    заявки поступают через ограниченную очередь (при переполнении сервис отвечает 503).
+    """
+
+    def __init__(self, template_path=TEMPLATE_DOCX_FILE, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 api_url=None, api_key=None):
+        self.template_path = template_path
+        self.workers_count = workers
+        self.api_url = api_url or DEEPSEEK_API_URL
+        self.api_key = api_key or DEEPSEEK_API_KEY
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.template_bytes = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.metrics = {
+            "requests_accepted": 0,
+            "requests_rejected": 0,
+            "requests_completed": 0,
+            "requests_failed": 0,
+            "requests_invalid": 0,
+            "requests_cancelled": 0,
+            "documents_failed": 0,
+            "busy_workers": 0,
+            "queue_wait_seconds_total": 0.0,
+            "render_seconds_total": 0.0,
+        }
+
+    def start(self):
+        """Загружает шаблон и запускает воркеры."""
+        self.template_bytes = load_template_bytes(self.template_path)
+        ready = []
+        for worker_id in range(self.workers_count):
+            started = threading.Event()
+            thread = threading.Thread(target=self.worker_loop, args=(worker_id, started), daemon=True,
+                                      name=f"render-worker-{worker_id}")
+            thread.start()
+            self.threads.append(thread)
+            ready.append(started)
+        for started in ready:
+            started.wait()
+        print(f"Запущено воркеров: {self.workers_count}, емкость очереди: {self.jobs.maxsize}")
+        warn_if_pdf_rendering_unavailable()
+
+    def stop(self):
+        """Останавливает воркеры после обработки уже принятых заявок."""
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def submit(self, payload):
+        """
+        Ставит заявку в очередь. Возвращает задание (словарь с событиями done и cancelled)
+        или None, если очередь переполнена.
+        """
+        job = {"payload": payload, "done": threading.Event(), "cancelled": threading.Event(),
+               "result": None, "error": None, "invalid": None, "document_errors": [],
+               "enqueued_at": time.perf_counter()}
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            self.increment("requests_rejected")
+            return None
+        self.increment("requests_accepted")
+        return job
+
+    def increment(self, metric, value=1):
+        with self.lock:
+            self.metrics[metric] += value
+
+    def worker_loop(self, worker_id, started):
+        """Цикл воркера: прогрев (шаблон, HTTP-сессия), затем обработка заявок из очереди."""
+        tpl = DocxTemplate(io.BytesIO(self.template_bytes))
+        tpl.init_docx()  # Разбираем шаблон заранее, чтобы первая заявка не платила за это
+        session = requests.Session()
+        started.set()
+
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            if job["cancelled"].is_set():
+                # Клиент уже получил 504: не тратим воркер и вызов LLM на ненужный результат
+                self.increment("requests_cancelled")
+                job["done"].set()
+                continue
+            started_at = time.perf_counter()
+            self.increment("busy_workers")
+            self.increment("queue_wait_seconds_total", started_at - job["enqueued_at"])
+            try:
+                job["result"], job["document_errors"] = self.render(job["payload"], tpl, session)
+                self.increment("requests_completed")
+            except UndefinedError as e:
+                # Ошибка в данных клиента, а не в сервисе: отвечаем 422 и не считаем сбоем
+                job["invalid"] = f"В client_data не хватает данных для шаблона: {e}"
+                self.increment("requests_invalid")
+            except Exception as e:
+                print(f"Воркер {worker_id}: ошибка при генерации заявления: {e}")
+                job["error"] = str(e)
+                self.increment("requests_failed")
+            finally:
+                self.increment("busy_workers", -1)
+                self.increment("render_seconds_total", time.perf_counter() - started_at)
+                job["done"].set()
+        session.close()
+
+    def render(self, payload, tpl, session):
+        """
+        Обрабатывает одну заявку. Возвращает (DOCX в виде bytes, список ошибок документов).
+        Если не удалось извлечь данные ни из одного документа, заявление не генерируется (DOCX = None).
+        """
+        client_data = dict(payload["client_data"])
+
+        # Индекс дедупликации создается на каждую заявку: документы разных клиентов не смешиваются
+        dedup_index = OcrDedupIndex()
+        extracted_documents = []
+        document_errors = []
+        for document in payload.get("documents", []):
+            extracted = process_document(document["filename"], dedup_index, file_content=document["content"],
+                                         ocr_mode=payload.get("ocr_mode", DEFAULT_OCR_MODE))
+            error = document_error(extracted)
+            if error:
+                document_errors.append({"filename": document["filename"], "error": error})
+                self.increment("documents_failed")
+            else:
+                extracted_documents.append(extracted)
+        if document_errors and not extracted_documents:
+            return None, document_errors
+        merge_extracted_data(client_data, extracted_documents)
+
+        if payload.get("enhance", True) and self.api_key:
+            client_data = enhance_client_data_with_deepseek(client_data, session=session, stream=False,
+                                                            api_url=self.api_url, api_key=self.api_key)
+        set_default_ai_fields(client_data)
+
+        # Шаблон перечитывается из буфера в памяти при повторном рендеринге
+        tpl.template_file.seek(0)
+        return render_statement_to_bytes(client_data, tpl), document_errors
+
+    def get_metrics(self):
+        """Возвращает метрики очереди и воркеров."""
+        with self.lock:
+            metrics = dict(self.metrics)
+        finished = metrics["requests_completed"] + metrics["requests_failed"] + metrics["requests_invalid"]
+        queue_wait_total = metrics.pop("queue_wait_seconds_total")
+        render_total = metrics.pop("render_seconds_total")
+        metrics["queue_depth"] = self.jobs.qsize()
+        metrics["queue_capacity"] = self.jobs.maxsize
+        metrics["workers"] = self.workers_count
+        metrics["avg_queue_wait_seconds"] = round(queue_wait_total / finished, 4) if finished else 0.0
+        metrics["avg_render_seconds"] = round(render_total / finished, 4) if finished else 0.0
+        return metrics
+
+
+# --- HTTP-интерфейс ---
+def make_handler(service):
+    """Создает класс обработчика HTTP-запросов, привязанный к сервису."""
+
+    class RenderRequestHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, data, headers=None):
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.send_json(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                self.send_json(200, service.get_metrics())
+            else:
+                self.send_json(404, {"error": "Не найдено."})
+
+        def do_POST(self):
+            if self.path != "/render":
+                self.send_json(404, {"error": "Не найдено."})
+                return
+
+            # Без корректной длины тело читать нельзя: rfile.read(-1) ждет закрытия соединения
+            length_header = self.headers.get("Content-Length")
+            if length_header is None:
+                self.send_json(411, {"error": "Не указан заголовок Content-Length."})
+                return
+            try:
+                length = int(length_header)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self.send_json(400, {"error": f"Некорректный Content-Length: {length_header}"})
+                return
+            if length > MAX_BODY_BYTES:
+                self.send_json(413, {"error": "Слишком большой запрос."})
+                return
+            try:
+                payload = json.loads(self.rfile.read(length).decode('utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                self.send_json(400, {"error": f"Некорректный JSON: {e}"})
+                return
+            if not isinstance(payload, dict) or not isinstance(payload.get("client_data"), dict):
+                self.send_json(400, {"error": "Ожидается объект с полем client_data."})
+                return
+            documents = payload.get("documents", [])
+            if not isinstance(documents, list) or not all(
+                    isinstance(doc, dict) and isinstance(doc.get("filename"), str)
+                    and isinstance(doc.get("content_base64"), str) for doc in documents):
+                self.send_json(400, {"error": "documents должен быть списком объектов с полями filename и content_base64."})
+                return
+            if payload.get("ocr_mode", DEFAULT_OCR_MODE) not in (OCR_MODE_SINGLE, OCR_MODE_ADAPTIVE):
+                self.send_json(400, {"error": f"ocr_mode должен быть \"{OCR_MODE_SINGLE}\" или \"{OCR_MODE_ADAPTIVE}\"."})
+                return
+            # base64 проверяется здесь, чтобы битый документ давал 400, а не тихо пропадал в воркере
+            decoded_documents = []
+            for doc in documents:
+                try:
+                    content = base64.b64decode(doc["content_base64"], validate=True)
+                except (binascii.Error, ValueError) as e:
+                    self.send_json(400, {"error": f"Некорректный base64 в документе {doc['filename']}: {e}"})
+                    return
+                decoded_documents.append({"filename": doc["filename"], "content": content})
+            payload["documents"] = decoded_documents
+
+            job = service.submit(payload)
+            if job is None:
+                self.send_json(503, {"error": "Очередь переполнена, повторите запрос позже.",
+                                     "queue_depth": service.jobs.qsize()},
+                               headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+                return
+            if not job["done"].wait(REQUEST_TIMEOUT):
+                job["cancelled"].set()  # Воркер пропустит задание, если еще не взял его
+                self.send_json(504, {"error": "Превышено время ожидания генерации заявления."})
+                return
+            if job["error"]:
+                self.send_json(500, {"error": job["error"]})
+                return
+            if job["invalid"]:
+                self.send_json(422, {"error": job["invalid"]})
+                return
+            if job["result"] is None:
+                self.send_json(422, {"error": "Не удалось извлечь данные ни из одного документа.",
+                                     "document_errors": job["document_errors"]})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", DOCX_CONTENT_TYPE)
+            self.send_header("Content-Disposition", 'attachment; filename="bankruptcy_statement.docx"')
+            self.send_header("Content-Length", str(len(job["result"])))
+            if job["document_errors"]:
+                # Заголовки HTTP передаются в latin-1, поэтому кириллица экранируется (\uXXXX)
+                self.send_header("X-Document-Errors", json.dumps(job["document_errors"], ensure_ascii=True))
+            self.end_headers()
+            self.wfile.write(job["result"])
+
+    return RenderRequestHandler
+
+
+# --- Заглушка DeepSeek API для локальной проверки ---
+class StubDeepSeekHandler(BaseHTTPRequestHandler):
+    """Отвечает в формате DeepSeek Chat Completions фиксированным текстом (обычный и потоковый режимы)."""
+
+    reply = "Ответ локальной заглушки DeepSeek API."
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request_data = json.loads(self.rfile.read(length).decode('utf-8'))
+        if request_data.get("stream"):
+            chunk = {"choices": [{"delta": {"content": self.reply}}]}
+            body = f"data: {json.dumps(chunk, ensure_ascii=False)}\n\ndata: [DONE]\n\n".encode('utf-8')
+            content_type = "text/event-stream"
+        else:
+            response_data = {"choices": [{"message": {"role": "assistant", "content": self.reply}}]}
+            body = json.dumps(response_data, ensure_ascii=False).encode('utf-8')
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_llm_server(host=SERVICE_HOST, port=0):
+    """Запускает заглушку DeepSeek API в фоне и возвращает (сервер, URL эндпоинта)."""
+    server = ThreadingHTTPServer((host, port), StubDeepSeekHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}/v1/chat/completions"
+    print(f"Заглушка DeepSeek API запущена: {url}")
+    return server, url
+
+
+# --- Основной блок ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сервис генерации заявлений о банкротстве.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--template", default=TEMPLATE_DOCX_FILE)
+    parser.add_argument("--stub-llm", action="store_true",
+                        help="Использовать локальную заглушку вместо DeepSeek API (для проверки без ключа).")
+    args = parser.parse_args()
+
+    api_url, api_key = None, None
+    if args.stub_llm:
+        _, api_url = start_stub_llm_server(args.host)
+        api_key = "stub"
+
+    service = RenderService(args.template, workers=args.workers, queue_size=args.queue_size,
+                            api_url=api_url, api_key=api_key)
+    service.start()
+    httpd = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Сервис запущен: http://{args.host}:{args.port} (POST /render, GET /metrics, GET /health)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nОстановка сервиса...")
+    finally:
+        httpd.server_close()
+        service.stop()
@@ -0,0 +1,319 @@
+import io
+import os
+import json
+import random
+import argparse
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+from docx import Document as DocxDocument
+
+try:
+    from pypdf import PdfReader, PdfWriter  # Предпочитаемый вариант, если установлен
+except ImportError:
+    from PyPDF2 import PdfReader, PdfWriter  # Альтернатива
+
+# Опционально: PDF с текстовым слоем (кириллица требует встраивания TTF-шрифта)
+try:
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas as pdf_canvas
+    from reportlab.lib.pagesizes import A4
+except ImportError:
+    pdf_canvas = None
+
+# --- Конфигурация ---
+CORPUS_DIR = 'benchmark_corpus'
+MANIFEST_FILE = 'manifest.json'
+DEFAULT_SEED = 42
+DEFAULT_DOCUMENTS_PER_KIND = 3
+DEFAULT_XLSX_ROWS = 20000
+SCAN_SIZE = (1654, 2339)  # A4 при 200 DPI
+SCAN_FONT_SIZE = 40
+SCAN_FOOTNOTE_FONT_SIZE = 14  # Сноска, которую быстрый проход адаптивного OCR (половинное разрешение) не находит
+SCAN_FOOTNOTE = "Дело № А40-{number}/2024"  # Номер дела мелким шрифтом внизу скана
+
+# Шрифт с кириллицей для сканов и PDF. Можно указать свой через переменную окружения CORPUS_FONT_PATH.
+FONT_CANDIDATES = [
+    os.getenv("CORPUS_FONT_PATH", ""),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+    r"C:\Windows\Fonts\arial.ttf",
+]
+
+# --- Словари для синтетических данных ---
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Кузнецов", "Смирнов", "Попов", "Васильев", "Соколов", "Михайлов",
+              "Новиков", "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров", "Павлов"]
+FIRST_NAMES = ["Иван", "Пётр", "Сергей", "Алексей", "Дмитрий", "Андрей", "Михаил", "Николай", "Владимир",
+               "Евгений", "Олег", "Виктор", "Юрий", "Григорий"]
+PATRONYMICS = ["Иванович", "Петрович", "Сергеевич", "Алексеевич", "Дмитриевич", "Андреевич", "Михайлович",
+               "Николаевич", "Владимирович", "Олегович", "Викторович", "Юрьевич"]
+CITIES = ["Екатеринбург", "Москва", "Пермь", "Челябинск", "Тюмень", "Казань", "Самара", "Уфа"]
+CREDITORS = ["Банк 'Восточный Экспресс'", "МФО 'Быстрые Деньги'", "АО 'Альфа-Кредит'", "ПАО 'Народный Банк'",
+             "ООО 'Займ Онлайн'", "АО 'Уральский Банк Реконструкции и Развития'"]
+TRANSACTION_TYPES = ["Оплата в магазине", "Перевод по номеру телефона", "Снятие наличных в банкомате",
+                     "Погашение кредита", "Зачисление заработной платы", "Оплата коммунальных услуг"]
+
+
+# --- Генерация данных клиента ---
+def generate_person(rng):
+    """Генерирует данные клиента и эталонные сущности, которые должен найти simple_ner_from_text."""
+    is_female = rng.random() < 0.5
+    last_name = rng.choice(LAST_NAMES)
+    patronymic = rng.choice(PATRONYMICS)
+    if is_female:
+        # Женская форма: Иванова Анна Петровна
+        last_name += "а"
+        first_name = rng.choice(["Анна", "Мария", "Елена", "Ольга", "Татьяна", "Наталья", "Ирина", "Светлана"])
+        patronymic = patronymic[:-4] + "овна" if patronymic.endswith("ович") else patronymic[:-4] + "евна"
+    else:
+        first_name = rng.choice(FIRST_NAMES)
+
+    passport_series = f"{rng.randint(10, 99)} {rng.randint(10, 99):02d}"
+    person = {
+        "fio": f"{last_name} {first_name} {patronymic}",
+        "birth_date": f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1950, 2003)}",
+        "passport_series": passport_series,
+        "passport_number": f"{rng.randint(100000, 999999)}",
+        "inn": f"{rng.randint(1, 9)}{rng.randint(0, 10 ** 11 - 1):011d}",
+        "snils": f"{rng.randint(100, 999)}-{rng.randint(100, 999)}-{rng.randint(100, 999)} {rng.randint(10, 99)}",
+        "city": rng.choice(CITIES),
+    }
+    person["expected_entities"] = {
+        "fio": person["fio"],
+        "birth_date": person["birth_date"],
+        "passport_series": passport_series.replace(" ", ""),
+        "passport_number": person["passport_number"],
+        "inn": person["inn"],
+        "snils": person["snils"],
+    }
+    return person
+
+
+def person_lines(person):
+    """Строки анкеты клиента. Дата в тексте только одна, чтобы эталон birth_date был однозначным."""
+    return [
+        "Анкета клиента",
+        f"ФИО: {person['fio']}",
+        f"Дата рождения: {person['birth_date']}",
+        f"Паспорт: {person['passport_series']} {person['passport_number']}, выдан ОВД г. {person['city']}",
+        f"ИНН {person['inn']}",
+        f"СНИЛС: {person['snils']}",
+        "Прочая информация о доходах и расходах.",
+    ]
+
+
+def generate_creditors(rng, count=3):
+    """Список кредиторов со случайными суммами долга."""
+    return [{"name": rng.choice(CREDITORS), "debt_amount": round(rng.uniform(10000, 1500000), 2),
+             "reason": f"Кредитный договор №{rng.randint(100, 9999)}"} for _ in range(count)]
+
+
+# --- Шрифт ---
+def find_font_path():
+    """Возвращает путь к TTF-шрифту с кириллицей или None."""
+    for path in FONT_CANDIDATES:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+# --- Генераторы документов ---
+def create_docx_with_tables(path, person, rng):
+    """DOCX: анкета абзацами и таблица кредиторов. Возвращает строки таблицы кредиторов (эталон)."""
+    doc = DocxDocument()
+    for line in person_lines(person):
+        doc.add_paragraph(line)
+    doc.add_paragraph("Сведения о кредиторах:")
+    rows = [{"name": creditor["name"], "debt_amount": f"{creditor['debt_amount']:.2f}", "reason": creditor["reason"]}
+            for creditor in generate_creditors(rng)]
+    table = doc.add_table(rows=1, cols=3)
+    header = table.rows[0].cells
+    header[0].text, header[1].text, header[2].text = "Кредитор", "Сумма долга, руб.", "Основание"
+    for row in rows:
+        cells = table.add_row().cells
+        cells[0].text = row["name"]
+        cells[1].text = row["debt_amount"]
+        cells[2].text = row["reason"]
+    doc.save(path)
+    return rows
+
+
+def create_large_xlsx(path, person, rng, rows):
+    """XLSX: лист 'Анкета Клиента' и большая банковская выписка. Возвращает эталон (число строк, сумма)."""
+    anketa = pd.DataFrame({
+        'ФИО': [person["fio"]],
+        'Дата рождения': [person["birth_date"]],
+        'ИНН': [person["inn"]],
+        'СНИЛС': [person["snils"]],
+    })
+    amounts = [round(rng.uniform(-50000, 50000), 2) for _ in range(rows)]
+    statement = pd.DataFrame({
+        'Дата': [f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2023" for _ in range(rows)],
+        'Описание операции': [rng.choice(TRANSACTION_TYPES) for _ in range(rows)],
+        'Сумма, руб.': amounts,
+    })
+    with pd.ExcelWriter(path) as writer:
+        anketa.to_excel(writer, sheet_name="Анкета Клиента", index=False)
+        statement.to_excel(writer, sheet_name="Выписка", index=False)
+    return {"statement_rows": rows, "statement_total": round(sum(amounts), 2)}
+
+
+def render_scan(lines, font_path, rng, noisy=True, footnote=None):
+    """
+    Рендерит страницу с текстом как скан. noisy=True добавляет поворот, размытие и шум.
+    footnote - строка мелким шрифтом внизу страницы.
+    """
+    image = Image.new('L', SCAN_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.truetype(font_path, SCAN_FONT_SIZE)
+    for i, line in enumerate(lines):
+        draw.text((120, 150 + i * int(SCAN_FONT_SIZE * 1.8)), line, fill=0, font=font)
+    if footnote:
+        draw.text((120, SCAN_SIZE[1] - 200), footnote, fill=0,
+                  font=ImageFont.truetype(font_path, SCAN_FOOTNOTE_FONT_SIZE))
+    if noisy:
+        image = image.rotate(rng.uniform(-1.0, 1.0), resample=Image.BICUBIC, fillcolor=255)
+        image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.3, 0.8)))
+        noise_rng = np.random.default_rng(rng.randint(0, 2 ** 32 - 1))
+        pixels = np.asarray(image, dtype=np.float32) + noise_rng.normal(0, 18, (SCAN_SIZE[1], SCAN_SIZE[0]))
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return image
+
+
+def text_layer_pdf_bytes(lines, font_path):
+    """PDF с текстовым слоем (reportlab, шрифт встраивается для кириллицы)."""
+    if "CorpusFont" not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont("CorpusFont", font_path))
+    output = io.BytesIO()
+    pdf = pdf_canvas.Canvas(output, pagesize=A4)
+    pdf.setFont("CorpusFont", 12)
+    _, page_height = A4
+    for i, line in enumerate(lines):
+        pdf.drawString(60, page_height - 80 - i * 20, line)
+    pdf.showPage()
+    pdf.save()
+    return output.getvalue()
+
+
+def scanned_pdf_bytes(image):
+    """PDF из одного изображения, без текстового слоя."""
+    output = io.BytesIO()
+    image.convert('RGB').save(output, "PDF", resolution=200)
+    return output.getvalue()
+
+
+def merge_pdf_pages(pdf_parts, path):
+    """Склеивает страницы нескольких PDF в один файл."""
+    writer = PdfWriter()
+    for part in pdf_parts:
+        for page in PdfReader(io.BytesIO(part)).pages:
+            writer.add_page(page)
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+
+# --- Генерация корпуса ---
+def generate_corpus(output_dir=CORPUS_DIR, seed=DEFAULT_SEED, documents_per_kind=DEFAULT_DOCUMENTS_PER_KIND,
+                    xlsx_rows=DEFAULT_XLSX_ROWS):
+    """
+    Генерирует воспроизводимый корпус документов с эталонными данными и сохраняет manifest.json.
+    Виды документов: docx_tables, xlsx_statement, pdf_text, pdf_scan, pdf_mixed, scan_png, scan_jpeg.
+    Сканы и PDF требуют TTF-шрифта с кириллицей, PDF с текстовым слоем - reportlab; без них эти виды пропускаются.
+    У каждого документа свой генератор случайных чисел (зерно, номер, вид), поэтому пропуск
+    необязательных видов не меняет данные и эталоны остальных документов.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    font_path = find_font_path()
+    if font_path is None:
+        print("Шрифт с кириллицей не найден (укажите CORPUS_FONT_PATH). Сканы и PDF не будут созданы.")
+    if pdf_canvas is None:
+        print("reportlab не установлен. PDF с текстовым слоем и смешанные PDF не будут созданы.")
+
+    documents = []
+
+    def add(kind, filename, expected, expected_text=None):
+        entry = {"kind": kind, "file": filename, "expected": expected}
+        if expected_text is not None:
+            entry["expected_text"] = expected_text
+        documents.append(entry)
+        print(f"Создан файл корпуса: {filename}")
+
+    def document_rng(i, kind):
+        return random.Random(f"{seed}-{i}-{kind}")
+
+    for i in range(documents_per_kind):
+        person = generate_person(document_rng(i, "person"))
+        lines = person_lines(person)
+        text = '\n'.join(lines)
+
+        filename = f"docx_tables_{i}.docx"
+        creditors = create_docx_with_tables(os.path.join(output_dir, filename), person, document_rng(i, "docx_tables"))
+        add("docx_tables", filename, {**person["expected_entities"], "creditors": creditors}, text)
+
+        filename = f"xlsx_statement_{i}.xlsx"
+        statement = create_large_xlsx(os.path.join(output_dir, filename), person, document_rng(i, "xlsx_statement"),
+                                      xlsx_rows)
+        expected = {"ФИО": person["fio"], "Дата рождения": person["birth_date"], "ИНН": person["inn"],
+                    "СНИЛС": person["snils"], **statement}
+        add("xlsx_statement", filename, expected)
+
+        if font_path is None:
+            continue
+
+        footnote = SCAN_FOOTNOTE.format(number=document_rng(i, "footnote").randint(100000, 999999))
+        scan_text = text + '\n' + footnote
+        for kind, extension in (("scan_png", "png"), ("scan_jpeg", "jpg")):
+            filename = f"{kind}_{i}.{extension}"
+            path = os.path.join(output_dir, filename)
+            scan = render_scan(lines, font_path, document_rng(i, kind), footnote=footnote)
+            if extension == "jpg":
+                scan.save(path, quality=70)
+            else:
+                scan.save(path)
+            # Эталонный текст рядом со сканом (формат ocr_benchmark.py)
+            with open(path + ".gt.txt", 'w', encoding='utf-8') as f:
+                f.write(scan_text)
+            add(kind, filename, person["expected_entities"], scan_text)
+
+        filename = f"pdf_scan_{i}.pdf"
+        with open(os.path.join(output_dir, filename), 'wb') as f:
+            f.write(scanned_pdf_bytes(render_scan(lines, font_path, document_rng(i, "pdf_scan"))))
+        add("pdf_scan", filename, person["expected_entities"], text)
+
+        if pdf_canvas is None:
+            continue
+
+        filename = f"pdf_text_{i}.pdf"
+        with open(os.path.join(output_dir, filename), 'wb') as f:
+            f.write(text_layer_pdf_bytes(lines, font_path))
+        add("pdf_text", filename, person["expected_entities"], text)
+
+        # Смешанный PDF: первая половина анкеты - текстовым слоем, вторая - сканом
+        filename = f"pdf_mixed_{i}.pdf"
+        merge_pdf_pages([text_layer_pdf_bytes(lines[:4], font_path),
+                         scanned_pdf_bytes(render_scan(lines[4:], font_path, document_rng(i, "pdf_mixed")))],
+                        os.path.join(output_dir, filename))
+        add("pdf_mixed", filename, person["expected_entities"], text)
+
+    manifest = {"seed": seed, "documents_per_kind": documents_per_kind, "xlsx_rows": xlsx_rows,
+                "documents": documents}
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    print(f"Корпус из {len(documents)} документов сохранен в {os.path.abspath(output_dir)}")
+    return manifest
+
+
+# --- Основной блок ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генератор синтетического корпуса документов с эталонными данными.")
+    parser.add_argument("--output-dir", default=CORPUS_DIR)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--count", type=int, default=DEFAULT_DOCUMENTS_PER_KIND, help="Документов каждого вида.")
+    parser.add_argument("--xlsx-rows", type=int, default=DEFAULT_XLSX_ROWS, help="Строк в банковской выписке XLSX.")
+    args = parser.parse_args()
+
+    generate_corpus(args.output_dir, args.seed, args.count, args.xlsx_rows)
@@ -1,5 +1,8 @@
 import os
+import io
+import shutil
 import json
+import contextlib
 import re  # Для регулярных выражений (NER)
 
 # Библиотеки для PDF
@@ -7,14 +10,24 @@ try:
     from pypdf import PdfReader  # Предпочитаемый вариант, если установлен
 except ImportError:
     from PyPDF2 import PdfReader  # Альтернатива
-from PIL import Image  # Pillow для работы с изображениями
+from PIL import Image, ImageOps  # Pillow для работы с изображениями
 import pytesseract  # Для OCR
 import cv2  # OpenCV для предобработки изображений перед OCR
+import numpy as np  # Для передачи PIL-изображений в OpenCV
+
+# Опционально: рендеринг страниц PDF в изображения (требует Poppler)
+try:
+    from pdf2image import convert_from_path, convert_from_bytes
+except ImportError:
+    convert_from_path = None
+    convert_from_bytes = None
 
 # Библиотеки для Excel и Word
 import pandas as pd
 from docx import Document as DocxDocument  # Переименовываем, чтобы не конфликтовать с нашим Document из docxtpl
 
+from ocr_dedup import OcrDedupIndex  # Дедупликация сканов по нормализованной маске страницы
+
 # --- Настройка Tesseract (если необходимо) ---
 # Раскомментируйте и укажите ваш путь, если Tesseract не в системном PATH
 # if os.name == 'nt': # Для Windows
@@ -25,39 +38,313 @@ from docx import Document as DocxDocument  # Переименовываем, ч
 # --- Константы и простые паттерны для NER ---
 # Эти паттерны очень упрощены. Для продакшена нужны более надежные NER-модели (spaCy, Natasha, etc.)
 PATTERNS = {
-    "fio": r"([А-ЯЁ][а-яё]+(?:-[А-ЯЁ][а-яё]+)?\s+[А-ЯЁ][а-яё]+\s+[А-ЯЁ][а-яё]+)",  # Ф И О
+    # Ф И О; отчество на -ич/-на, чтобы не принимать за ФИО названия из таблиц ("Банк Реконструкции и Развития")
+    "fio": r"([А-ЯЁ][а-яё]+(?:-[А-ЯЁ][а-яё]+)?\s+[А-ЯЁ][а-яё]+\s+[А-ЯЁ][а-яё]+(?:ич|на))\b",
     "birth_date": r"\b(\d{2}\.\d{2}\.\d{4})\b",  # ДД.ММ.ГГГГ
     "passport_series_number": r"\b(\d{2}\s?\d{2})\s*N?\s*(\d{6})\b",  # Серия (XX XX или XXXX) и номер (XXXXXX)
     "inn": r"\bИНН\s*(\d{10}|\d{12})\b",  # ИНН 10 или 12 цифр
     "snils": r"\b(\d{3}-\d{3}-\d{3}\s\d{2})\b"  # СНИЛС XXX-XXX-XXX XX
 }
 
+PDF_OCR_DPI = 300  # Разрешение рендеринга страниц PDF для OCR
+# Предобработка перед OCR. Подобрано по ocr_benchmark.py на зашумленных сканах corpus_generator.py:
+# прежний порог (окно 11, C=2) без медианного фильтра давал пустой текст, этот - точность 0.92 (см. README).
+OCR_MEDIAN_BLUR_SIZE = 3
+OCR_THRESHOLD_BLOCK_SIZE = 51
+OCR_THRESHOLD_C = 25
+
+# --- Режимы OCR ---
+OCR_MODE_SINGLE = "single"  # Один проход image_to_string в исходном разрешении
+OCR_MODE_ADAPTIVE = "adaptive"  # Быстрый проход в низком разрешении + повторный OCR неуверенных строк
+DEFAULT_OCR_MODE = OCR_MODE_SINGLE
+ADAPTIVE_OCR_LOW_SCALE = 0.5  # Масштаб изображения для быстрого прохода
+ADAPTIVE_OCR_MIN_CONFIDENCE = 80  # Строки со средней уверенностью ниже порога распознаются повторно в полном разрешении
+ADAPTIVE_OCR_LINE_PADDING = 10  # Поля (в пикселях полного разрешения) вокруг строки при повторном OCR
+# Поиск текста, пропущенного быстрым проходом (в пикселях уменьшенного изображения)
+ADAPTIVE_OCR_JOIN_WIDTH = 15  # Ширина склейки соседних символов в строку
+ADAPTIVE_OCR_MIN_REGION_HEIGHT = 5  # Более низкие пятна считаются шумом
+ADAPTIVE_OCR_MIN_REGION_INK = 30  # Минимум пикселей "чернил" во фрагменте
+ADAPTIVE_OCR_MAX_MISSED_SHARE = 0.5  # Если вне распознанных слов больше этой доли чернил - полный проход
+
+
+# --- Документы в памяти ---
+class NamedBytesIO(io.BytesIO):
+    """Содержимое файла в памяти с именем файла (например, документ, загруженный в сервис)."""
+
+    def __init__(self, content, name):
+        super().__init__(content)
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+def open_source(source):
+    """Открывает файл по пути на чтение или возвращает уже открытый поток (NamedBytesIO) с начала."""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    source.seek(0)
+    return contextlib.nullcontext(source)
+
 
 # --- Функции извлечения текста из PDF ---
+def binarize_image_for_ocr(img):
+    """Бинаризует изображение OpenCV (BGR) и возвращает PIL Image для pytesseract."""
+    # 1. Преобразование в оттенки серого
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    # 2. Удаление шума до бинаризации: иначе адаптивный порог превращает зерно скана в точки,
+    # и Tesseract не находит на странице ни одной строки
+    denoised = cv2.medianBlur(gray, OCR_MEDIAN_BLUR_SIZE)
+    # 3. Бинаризация адаптивным порогом (устойчива к неравномерному освещению)
+    # _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV) # Инвертированный бинарный
+    thresh = cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                   OCR_THRESHOLD_BLOCK_SIZE, OCR_THRESHOLD_C)
+    # cv2.imwrite("temp_processed_ocr_page.png", thresh) # Для отладки
+    return Image.fromarray(thresh)  # pytesseract работает с PIL Image
+
+
 def preprocess_image_for_ocr(image_path):
     """Предобработка изображения для улучшения качества OCR."""
     try:
         img = cv2.imread(image_path)
-        # 1. Преобразование в оттенки серого
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        # 2. Бинаризация (адаптивный порог может быть лучше для некоторых изображений)
-        # _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV) # Инвертированный бинарный
-        thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-        # 3. Удаление шума (опционально)
-        # denoised = cv2.medianBlur(thresh, 3)
-        # cv2.imwrite("temp_processed_ocr_page.png", thresh) # Для отладки
-        return Image.fromarray(thresh)  # pytesseract работает с PIL Image
+        return binarize_image_for_ocr(img)
     except Exception as e:
         print(f"Ошибка при предобработке изображения {image_path}: {e}")
         # В случае ошибки, пытаемся прочитать как есть
         return Image.open(image_path)
 
 
-def extract_text_from_pdf(pdf_path):
-    """Извлекает текст из PDF. Сначала пытается извлечь текстовый слой, потом OCR."""
+def preprocess_pil_image_for_ocr(pil_image):
+    """Предобработка уже загруженного изображения (PIL Image), например, отрендеренной страницы PDF."""
+    try:
+        img = cv2.cvtColor(np.array(pil_image.convert('RGB')), cv2.COLOR_RGB2BGR)
+        return binarize_image_for_ocr(img)
+    except Exception as e:
+        print(f"Ошибка при предобработке изображения: {e}")
+        return pil_image
+
+
+# --- Адаптивный OCR по уверенности Tesseract ---
+def ocr_words_with_confidence(image, config=''):
+    """
+    Распознает изображение через image_to_data и возвращает список слов с уверенностью и координатами.
+    Каждое слово - словарь: text, conf, left, top, width, height, line (ключ строки).
+    """
+    data = pytesseract.image_to_data(image, lang='rus+eng', config=config, output_type=pytesseract.Output.DICT)
+    words = []
+    for i, word_text in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if conf < 0 or not word_text.strip():
+            continue
+        words.append({
+            "text": word_text.strip(),
+            "conf": conf,
+            "left": data["left"][i],
+            "top": data["top"][i],
+            "width": data["width"][i],
+            "height": data["height"][i],
+            "line": (data["page_num"][i], data["block_num"][i], data["par_num"][i], data["line_num"][i]),
+        })
+    return words
+
+
+def group_words_into_lines(words):
+    """Группирует слова по строкам Tesseract с сохранением порядка чтения."""
+    lines = {}
+    for word in words:
+        lines.setdefault(word["line"], []).append(word)
+    return list(lines.values())
+
+
+def mean_confidence(words):
+    """Средняя уверенность по списку слов (0, если слов нет)."""
+    return sum(word["conf"] for word in words) / len(words) if words else 0.0
+
+
+def scale_word_boxes(words, factor):
+    """Возвращает копии слов с координатами, умноженными на factor."""
+    scaled = []
+    for word in words:
+        word = dict(word)
+        for key in ("left", "top", "width", "height"):
+            word[key] = int(word[key] * factor)
+        scaled.append(word)
+    return scaled
+
+
+def words_bounding_box(words, padding, width, height):
+    """Общая рамка слов (left, top, right, bottom) с полями padding, обрезанная по размеру изображения."""
+    return (max(0, min(word["left"] for word in words) - padding),
+            max(0, min(word["top"] for word in words) - padding),
+            min(width, max(word["left"] + word["width"] for word in words) + padding),
+            min(height, max(word["top"] + word["height"] for word in words) + padding))
+
+
+def find_missed_text_regions(binary_image, words):
+    """
+    Ищет на бинаризованном изображении текст, которого нет среди распознанных слов.
+    "Чернила" вне рамок слов склеиваются по горизонтали в строки; мелкие пятна (шум) отбрасываются.
+    Возвращает (список рамок (left, top, right, bottom), доля чернил страницы вне распознанных слов).
+    """
+    ink = (np.array(binary_image) < 128).astype(np.uint8)
+    total_ink = int(ink.sum())
+    if total_ink == 0:
+        return [], 0.0
+    uncovered = ink.copy()
+    for word in words:
+        uncovered[max(0, word["top"] - 2):word["top"] + word["height"] + 2,
+                  max(0, word["left"] - 2):word["left"] + word["width"] + 2] = 0
+    missed_ink = int(uncovered.sum())
+
+    # Соседние символы одной строки сливаются в один блок
+    joined = cv2.dilate(uncovered, np.ones((3, ADAPTIVE_OCR_JOIN_WIDTH), np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(joined)
+    regions = []
+    for left, top, width, height, _ in stats[1:count]:
+        if height < ADAPTIVE_OCR_MIN_REGION_HEIGHT:
+            continue
+        if int(uncovered[top:top + height, left:left + width].sum()) < ADAPTIVE_OCR_MIN_REGION_INK:
+            continue
+        regions.append((int(left), int(top), int(left + width), int(top + height)))
+    return regions, missed_ink / total_ink
+
+
+def ocr_regions_in_one_pass(image, regions):
+    """
+    Склеивает фрагменты изображения в столбец и распознает их одним вызовом Tesseract
+    (каждый запуск Tesseract сам по себе стоит заметного времени на загрузку моделей).
+    Возвращает для каждого фрагмента список слов в координатах исходного изображения.
+    """
+    gap = 2 * ADAPTIVE_OCR_LINE_PADDING
+    crops = [image.crop(region) for region in regions]
+    canvas = Image.new('L', (max(crop.width for crop in crops) + 2 * gap,
+                             sum(crop.height for crop in crops) + gap * (len(crops) + 1)), 255)
+    offsets = []
+    y = gap
+    for crop in crops:
+        canvas.paste(crop.convert('L'), (gap, y))
+        offsets.append(y)
+        y += crop.height + gap
+
+    # --psm 6: столбец фрагментов распознается как единый блок текста
+    region_words = [[] for _ in regions]
+    for word in ocr_words_with_confidence(canvas, config='--psm 6'):
+        center = word["top"] + word["height"] / 2
+        for i, (region, offset, crop) in enumerate(zip(regions, offsets, crops)):
+            if offset <= center < offset + crop.height:
+                word["left"] += region[0] - gap
+                word["top"] += region[1] - offset
+                region_words[i].append(word)
+                break
+    return region_words
+
+
+def adaptive_ocr_image(page_image, low_scale=ADAPTIVE_OCR_LOW_SCALE, min_confidence=ADAPTIVE_OCR_MIN_CONFIDENCE,
+                       recover_missed=True):
+    """
+    Двухуровневый OCR страницы (PIL Image).
+    1. Быстрый проход по уменьшенному изображению с пословной уверенностью из image_to_data.
+    2. Строки со средней уверенностью ниже min_confidence и текст, который быстрый проход не нашел
+       (чернила вне рамок распознанных слов), распознаются в полном разрешении одним вызовом Tesseract.
+    Если быстрый проход пропустил большую часть страницы, выполняется обычный проход в полном разрешении.
+    recover_missed=False отключает поиск пропущенного текста (для сравнения в ocr_benchmark.py).
+    Возвращает (текст, список слов с уверенностью в координатах полного разрешения).
+    """
+    low_size = (max(1, int(page_image.width * low_scale)), max(1, int(page_image.height * low_scale)))
+    low_image = preprocess_pil_image_for_ocr(page_image.resize(low_size, Image.LANCZOS))
+    low_words = ocr_words_with_confidence(low_image)
+    missed_regions, missed_share = find_missed_text_regions(low_image, low_words) if recover_missed else ([], 0.0)
+
+    full_image = preprocess_pil_image_for_ocr(page_image)
+    if not low_words or missed_share > ADAPTIVE_OCR_MAX_MISSED_SHARE:
+        print(f"Адаптивный OCR: быстрый проход пропустил {missed_share:.0%} текста, распознаем страницу целиком")
+        words = ocr_words_with_confidence(full_image)
+        return '\n'.join(' '.join(word["text"] for word in line_words)
+                         for line_words in group_words_into_lines(words)), words
+
+    lines = [scale_word_boxes(line_words, 1 / low_scale) for line_words in group_words_into_lines(low_words)]
+    weak_lines = [i for i, line_words in enumerate(lines) if mean_confidence(line_words) < min_confidence]
+    padding = ADAPTIVE_OCR_LINE_PADDING
+    missed_regions = [(max(0, int(left / low_scale) - padding), max(0, int(top / low_scale) - padding),
+                       min(full_image.width, int(right / low_scale) + padding),
+                       min(full_image.height, int(bottom / low_scale) + padding))
+                      for left, top, right, bottom in missed_regions]
+
+    regions = [words_bounding_box(lines[i], padding, full_image.width, full_image.height)
+               for i in weak_lines] + missed_regions
+    if regions:
+        region_words = ocr_regions_in_one_pass(full_image, regions)
+        for i, reocr_words in zip(weak_lines, region_words):
+            if reocr_words and mean_confidence(reocr_words) > mean_confidence(lines[i]):
+                lines[i] = reocr_words
+        lines += [reocr_words for reocr_words in region_words[len(weak_lines):] if reocr_words]
+
+    lines.sort(key=lambda line_words: min(word["top"] for word in line_words))
+    print(f"Адаптивный OCR: строк {len(lines)}, повторно распознано в полном разрешении: {len(weak_lines)}, "
+          f"найдено пропущенных фрагментов: {len(missed_regions)}")
+    page_words = [word for line_words in lines for word in line_words]
+    return '\n'.join(' '.join(word["text"] for word in line_words) for line_words in lines), page_words
+
+
+def field_confidence(structured_data, words):
+    """
+    Оценивает уверенность OCR для каждого извлеченного поля.
+    Уверенность поля - минимальная уверенность среди слов, из которых состоит его значение.
+    Для полей со списком значений возвращается список уверенностей.
+    """
+    # Склеиваем слова без пробелов и запоминаем, какой отрезок какому слову принадлежит
+    page_text = ""
+    spans = []
+    for word in words:
+        start = len(page_text)
+        page_text += word["text"]
+        spans.append((start, len(page_text), word["conf"]))
+
+    def value_confidence(value):
+        needle = re.sub(r"\s", "", str(value))
+        start = page_text.find(needle)
+        if not needle or start == -1:
+            return None
+        end = start + len(needle)
+        return round(min(conf for span_start, span_end, conf in spans if span_start < end and span_end > start), 1)
+
+    confidences = {}
+    for field, value in structured_data.items():
+        if isinstance(value, list):
+            confidences[field] = [value_confidence(item) for item in value]
+        else:
+            confidences[field] = value_confidence(value)
+    return confidences
+
+
+def ocr_page_image(page_image, source, dedup_index=None, ocr_mode=DEFAULT_OCR_MODE):
+    """
+    Распознает одну страницу (PIL Image). Возвращает (текст, список слов с уверенностью).
+    В режиме OCR_MODE_SINGLE список слов пуст.
+    Если передан индекс дедупликации, для почти-дубликатов уже распознанных страниц
+    результат берется из индекса без повторного запуска Tesseract.
+    """
+    def run_ocr(image):
+        if ocr_mode == OCR_MODE_ADAPTIVE:
+            return adaptive_ocr_image(image)
+        return pytesseract.image_to_string(preprocess_pil_image_for_ocr(image), lang='rus+eng'), []
+
+    if dedup_index is None:
+        return run_ocr(page_image)
+    return dedup_index.ocr_with_dedup(page_image, source, run_ocr)
+
+
+def extract_text_from_pdf(pdf_path, dedup_index=None, ocr_mode=DEFAULT_OCR_MODE, ocr_words=None):
+    """
+    Извлекает текст из PDF. Сначала пытается извлечь текстовый слой, потом OCR.
+    pdf_path может быть путем к файлу или NamedBytesIO.
+    dedup_index (OcrDedupIndex) позволяет не распознавать повторно уже встречавшиеся страницы.
+    ocr_mode - режим постраничного OCR; в список ocr_words (если передан) добавляются
+    распознанные слова с уверенностью (только для OCR_MODE_ADAPTIVE).
+    """
     text_content = ""
     try:
-        with open(pdf_path, 'rb') as f:
+        with open_source(pdf_path) as f:
             reader = PdfReader(f)
             # Попытка 1: Извлечь текстовый слой
             for page_num in range(len(reader.pages)):
@@ -74,51 +361,44 @@ def extract_text_from_pdf(pdf_path):
             # Попытка 2: OCR, если текстовый слой пуст или его нет
             print(f"Текстовый слой в PDF {pdf_path} пуст или отсутствует. Попытка OCR...")
             text_content_ocr = ""
-            # Конвертируем PDF в изображения (требует pdf2image или poppler-utils)
-            # Для простоты здесь будем считать, что PDF - это уже изображение или
-            # мы используем внешнюю утилиту для конвертации страниц PDF в PNG/JPG.
-            # Вместо этого, можно использовать PdfReader для извлечения изображений со страницы,
-            # если они там есть, или рендерить страницы в изображения.
-
-            # Упрощенный вариант: считаем, что если текстового слоя нет, то весь PDF - это скан
-            # и пытаемся применить OCR ко всему файлу (Tesseract может это делать для некоторых PDF)
-            # Более надежно - конвертировать каждую страницу в изображение и применять OCR.
-            # Для примера, мы будем использовать только первую страницу PDF для OCR, если он многостраничный.
-            # Иначе код усложнится (нужна библиотека типа pdf2image)
+            # Конвертируем PDF в изображения (требует pdf2image и poppler-utils).
+            # Если pdf2image не установлен, считаем, что весь PDF - это скан,
+            # и пытаемся применить OCR ко всему файлу (Tesseract может это делать для некоторых PDF).
+
+            # Если доступен pdf2image, рендерим каждую страницу в изображение и распознаем по отдельности.
+            # Это позволяет сопоставлять страницы PDF с отдельными сканами (PNG/JPEG) в индексе дедупликации.
+            if convert_from_path is not None:
+                try:
+                    if isinstance(pdf_path, NamedBytesIO):
+                        images = convert_from_bytes(pdf_path.getvalue(), dpi=PDF_OCR_DPI)
+                    else:
+                        images = convert_from_path(pdf_path, dpi=PDF_OCR_DPI)
+                    for i, page_image in enumerate(images):
+                        page_text, page_words = ocr_page_image(page_image, f"{pdf_path} (стр. {i + 1})",
+                                                               dedup_index, ocr_mode)
+                        text_content_ocr += page_text + "\n"
+                        if ocr_words is not None:
+                            ocr_words.extend(page_words)
+                    if text_content_ocr.strip():
+                        print(f"Текст извлечен из PDF через OCR (страница за страницей): {pdf_path}")
+                        return text_content_ocr
+                except Exception as e_pdf2image:
+                    print(f"Ошибка при конвертации PDF в изображения для OCR ({pdf_path}): {e_pdf2image}. Убедитесь, что poppler установлен.")
 
             # Эта часть с Tesseract напрямую для PDF может не всегда хорошо работать.
-            # Лучше конвертировать страницы в PNG/JPG.
-            try:
-                # Tesseract может пытаться обработать PDF напрямую, если он содержит изображения
-                text_content_ocr = pytesseract.image_to_string(pdf_path, lang='rus+eng')
-                if text_content_ocr.strip():
-                    print(f"Текст извлечен из PDF через OCR (прямая обработка): {pdf_path}")
-                    return text_content_ocr
-            except pytesseract.TesseractError as e_tess_direct:
-                print(f"Ошибка Tesseract при прямой обработке PDF {pdf_path}: {e_tess_direct}")
-            except Exception as e_direct_ocr:
-                print(f"Общая ошибка при OCR PDF напрямую {pdf_path}: {e_direct_ocr}")
-
-            # Если выше не сработало, и если у нас есть способ конвертировать PDF в изображения:
-            # Допустим, у нас есть папка с изображениями страниц PDF (page_1.png, page_2.png ...)
-            # Или мы используем библиотеку pdf2image для этого:
-            # from pdf2image import convert_from_path
-            # try:
-            #     images = convert_from_path(pdf_path, dpi=300) # dpi для качества
-            #     for i, image_pil in enumerate(images):
-            #         # Сохраняем временное изображение для OpenCV или используем PIL напрямую
-            #         temp_image_path = f"temp_page_{i}.png"
-            #         image_pil.save(temp_image_path, "PNG")
-            #         processed_image = preprocess_image_for_ocr(temp_image_path)
-            #         page_text = pytesseract.image_to_string(processed_image, lang='rus+eng')
-            #         text_content_ocr += page_text + "\n"
-            #         os.remove(temp_image_path) # Удаляем временный файл
-            #     if text_content_ocr.strip():
-            #         print(f"Текст извлечен из PDF через OCR (страница за страницей): {pdf_path}")
-            #         return text_content_ocr
-            # except Exception as e_pdf2image:
-            #     print(f"Ошибка при конвертации PDF в изображения для OCR ({pdf_path}): {e_pdf2image}. Убедитесь, что poppler установлен.")
-            #     return "Ошибка OCR: не удалось обработать PDF как изображение."
+            # Лучше конвертировать страницы в PNG/JPG (см. выше).
+            # Прямая обработка возможна только для файла на диске.
+            if not isinstance(pdf_path, NamedBytesIO):
+                try:
+                    # Tesseract может пытаться обработать PDF напрямую, если он содержит изображения
+                    text_content_ocr = pytesseract.image_to_string(pdf_path, lang='rus+eng')
+                    if text_content_ocr.strip():
+                        print(f"Текст извлечен из PDF через OCR (прямая обработка): {pdf_path}")
+                        return text_content_ocr
+                except pytesseract.TesseractError as e_tess_direct:
+                    print(f"Ошибка Tesseract при прямой обработке PDF {pdf_path}: {e_tess_direct}")
+                except Exception as e_direct_ocr:
+                    print(f"Общая ошибка при OCR PDF напрямую {pdf_path}: {e_direct_ocr}")
 
             # Если ни один из методов OCR для PDF не сработал и нет текстового слоя
             if not text_content.strip() and not text_content_ocr.strip():
@@ -132,11 +412,25 @@ def extract_text_from_pdf(pdf_path):
 
 
 # --- Функция извлечения текста из изображений (для OCR сканов не-PDF) ---
-def extract_text_from_image(image_path):
-    """Извлекает текст из файла изображения с помощью OCR."""
+def extract_text_from_image(image_path, dedup_index=None, ocr_mode=DEFAULT_OCR_MODE, ocr_words=None):
+    """
+    Извлекает текст из файла изображения с помощью OCR.
+    image_path может быть путем к файлу или NamedBytesIO.
+    dedup_index (OcrDedupIndex) позволяет переиспользовать OCR уже встречавшихся сканов.
+    ocr_mode - OCR_MODE_SINGLE или OCR_MODE_ADAPTIVE; в список ocr_words (если передан)
+    добавляются распознанные слова с уверенностью (только для OCR_MODE_ADAPTIVE).
+    """
     try:
-        processed_image = preprocess_image_for_ocr(image_path)
-        text = pytesseract.image_to_string(processed_image, lang='rus+eng')  # 'rus+eng' для русского и английского
+        if dedup_index is None and ocr_mode == OCR_MODE_SINGLE and not isinstance(image_path, NamedBytesIO):
+            processed_image = preprocess_image_for_ocr(image_path)
+            text = pytesseract.image_to_string(processed_image, lang='rus+eng')  # 'rus+eng' для русского и английского
+        else:
+            with Image.open(image_path) as page_image:
+                # Фото и сканы с телефона часто хранят поворот только в EXIF
+                page_image = ImageOps.exif_transpose(page_image)
+                text, page_words = ocr_page_image(page_image, image_path, dedup_index, ocr_mode)
+            if ocr_words is not None:
+                ocr_words.extend(page_words)
         print(f"Текст извлечен из изображения через OCR: {image_path}")
         return text
     except pytesseract.TesseractNotFoundError:
@@ -173,11 +467,10 @@ def extract_text_from_word(word_path):
         full_text = []
         for para in doc.paragraphs:
             full_text.append(para.text)
-        # Также можно извлекать текст из таблиц, если это необходимо
-        # for table in doc.tables:
-        #     for row in table.rows:
-        #         for cell in row.cells:
-        #             full_text.append(cell.text)
+        # Таблицы (например, список кредиторов): строка таблицы - строка текста, ячейки через табуляцию
+        for table in doc.tables:
+            for row in table.rows:
+                full_text.append('\t'.join(cell.text for cell in row.cells))
         content = '\n'.join(full_text)
         print(f"Текст извлечен из Word: {word_path}")
         return content
@@ -204,10 +497,15 @@ def simple_ner_from_text(text_content):
 
 
 # --- Диспетчер обработки файлов ---
-def process_document(file_path):
+def process_document(file_path, dedup_index=None, file_content=None, ocr_mode=DEFAULT_OCR_MODE):
     """
     Определяет тип файла и вызывает соответствующую функцию для извлечения данных.
     Возвращает словарь с извлеченными данными.
+    dedup_index (OcrDedupIndex) - общий для пакета индекс дедупликации сканов (опционально).
+    file_content (bytes) - содержимое файла, если документ получен не с диска (например, загружен в сервис).
+    В этом случае file_path используется только для определения имени и типа файла.
+    ocr_mode - режим OCR для сканов. В режиме OCR_MODE_ADAPTIVE в structured_data["field_confidence"]
+    добавляется уверенность OCR для каждого извлеченного поля.
     """
     _, file_extension = os.path.splitext(file_path.lower())
     filename = os.path.basename(file_path)
@@ -215,17 +513,23 @@ def process_document(file_path):
 
     extracted_data = {"filename": filename, "file_type": file_extension, "content": None, "structured_data": {}}
 
-    if not os.path.exists(file_path):
+    if file_content is not None:
+        file_path = NamedBytesIO(file_content, filename)
+    elif not os.path.exists(file_path):
         extracted_data["error"] = "Файл не найден."
         print(f"Ошибка: Файл {file_path} не найден.")
         return extracted_data
 
     try:
         if file_extension == '.pdf':
-            text = extract_text_from_pdf(file_path)
+            ocr_words = []
+            text = extract_text_from_pdf(file_path, dedup_index, ocr_mode, ocr_words)
             extracted_data["content"] = text
             if not text.startswith("Ошибка") and not text.startswith("Не удалось"):
                 extracted_data["structured_data"] = simple_ner_from_text(text)
+                if ocr_words:
+                    extracted_data["structured_data"]["field_confidence"] = field_confidence(
+                        extracted_data["structured_data"], ocr_words)
         elif file_extension in ['.xls', '.xlsx']:
             excel_content = extract_data_from_excel(file_path)
             extracted_data["content"] = excel_content  # Здесь content - это структурированные данные
@@ -251,10 +555,14 @@ def process_document(file_path):
             if not text.startswith("Ошибка"):
                 extracted_data["structured_data"] = simple_ner_from_text(text)
         elif file_extension in ['.png', '.jpg', '.jpeg', '.tiff', '.bmp']:
-            text = extract_text_from_image(file_path)
+            ocr_words = []
+            text = extract_text_from_image(file_path, dedup_index, ocr_mode, ocr_words)
             extracted_data["content"] = text
             if not text.startswith("Ошибка"):
                 extracted_data["structured_data"] = simple_ner_from_text(text)
+                if ocr_words:
+                    extracted_data["structured_data"]["field_confidence"] = field_confidence(
+                        extracted_data["structured_data"], ocr_words)
         else:
             extracted_data["error"] = f"Неподдерживаемый тип файла: {file_extension}"
             print(f"Файл {filename} имеет неподдерживаемый тип: {file_extension}")
@@ -265,6 +573,41 @@ def process_document(file_path):
     return extracted_data
 
 
+# --- Пакетная обработка с дедупликацией сканов ---
+def pdf_rendering_available():
+    """Проверяет, что pdf2image установлен и Poppler (pdftoppm) найден в PATH."""
+    return convert_from_path is not None and shutil.which("pdftoppm") is not None
+
+
+def warn_if_pdf_rendering_unavailable():
+    """Предупреждает, что без pdf2image и Poppler страницы сканов PDF не участвуют в дедупликации."""
+    if not pdf_rendering_available():
+        print("Внимание: pdf2image или Poppler (pdftoppm) не найден. Сканированные PDF распознаются целиком, "
+              "их страницы не попадают в индекс дедупликации и не сопоставляются с PNG/JPEG. "
+              "Установите pdf2image (pip install -r requirements.txt) и Poppler (см. README).")
+
+
+def process_documents(file_paths, dedup_index=None, ocr_mode=DEFAULT_OCR_MODE):
+    """
+    Обрабатывает пакет файлов с общим индексом дедупликации сканов.
+    Одно и то же изображение страницы, пришедшее как PNG, JPEG и страница скана PDF, распознается один раз
+    (для страниц PDF нужны pdf2image и Poppler). Повторный скан того же листа распознается заново.
+    Возвращает кортеж (список извлеченных данных, статистика дедупликации).
+    """
+    warn_if_pdf_rendering_unavailable()
+    if dedup_index is None:
+        dedup_index = OcrDedupIndex()
+
+    all_extracted_data = []
+    for doc_path in file_paths:
+        data = process_document(doc_path, dedup_index, ocr_mode=ocr_mode)
+        all_extracted_data.append(data)
+        print("-" * 30)
+
+    dedup_index.print_report()
+    return all_extracted_data, dedup_index.get_stats()
+
+
 # --- Основной блок для демонстрации ---
 if __name__ == "__main__":
     # Создадим несколько тестовых файлов для демонстрации
@@ -333,11 +676,7 @@ if __name__ == "__main__":
         print(
             "\nНе найдены тестовые файлы для обработки. Поместите sample_text.pdf, sample_scan.pdf или sample_scan.png в папку.")
 
-    all_extracted_data = []
-    for doc_path in documents_to_process:
-        data = process_document(doc_path)
-        all_extracted_data.append(data)
-        print("-" * 30)
+    all_extracted_data, dedup_stats = process_documents(documents_to_process)
 
     print("\n--- Итоги извлечения ---")
     # Выведем структурированные данные, если они есть
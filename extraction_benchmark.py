@@ -0,0 +1,299 @@
+import gc
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import contextlib
+
+import pytesseract
+
+from corpus_generator import CORPUS_DIR, MANIFEST_FILE, generate_corpus
+from document_formation import (
+    extract_data_from_excel,
+    extract_text_from_image,
+    extract_text_from_pdf,
+    extract_text_from_word,
+    process_document,
+    simple_ner_from_text,
+)
+
+# --- Конфигурация ---
+BASELINE_FILE = 'benchmark_baseline.json'
+DEFAULT_REPEAT = 5  # Замеров пропускной способности на каждый случай (берется лучший)
+MIN_SAMPLE_SECONDS = 0.5  # Один замер повторяет проходы по корпусу, пока не наберется это время
+
+# Пороги регрессии относительно эталонного прогона (benchmark_baseline.json).
+# Пропускная способность зависит от машины: эталон нужно снимать там же, где идет проверка.
+MAX_THROUGHPUT_DROP = 0.30  # Падение пропускной способности более чем на 30%
+MAX_MEMORY_GROWTH = 0.25  # Рост пиковой памяти более чем на 25%
+MAX_ACCURACY_DROP = 0.02  # Падение точности более чем на 0.02 (абсолютное)
+
+ALL_KINDS = ["docx_tables", "xlsx_statement", "pdf_text", "pdf_scan", "pdf_mixed", "scan_png", "scan_jpeg"]
+TEXT_KINDS = [kind for kind in ALL_KINDS if kind != "xlsx_statement"]
+# Виды, для которых нужен Tesseract. Смешанные PDF сюда не входят: при наличии текстового слоя
+# extract_text_from_pdf не запускает OCR и сканированные страницы игнорируются.
+OCR_KINDS = ["pdf_scan", "scan_png", "scan_jpeg"]
+
+
+TABLE_KEY = "creditors"  # Ключ эталона с таблицей кредиторов DOCX (не сущность NER)
+
+
+# --- Оценка точности ---
+def entity_accuracy(found, expected):
+    """Доля эталонных сущностей, найденных с точным совпадением значения."""
+    expected = {key: value for key, value in expected.items() if key != TABLE_KEY}
+    if not expected:
+        return 1.0
+    matched = sum(1 for key, value in expected.items() if str(found.get(key, "")) == str(value))
+    return matched / len(expected)
+
+
+def table_accuracy(text, rows):
+    """Доля ячеек эталонной таблицы, найденных в извлеченном тексте."""
+    cells = [value for row in rows for value in row.values()]
+    if not cells:
+        return 1.0
+    return sum(1 for cell in cells if cell in text) / len(cells)
+
+
+def docx_accuracy(found, text, expected):
+    """Точность для DOCX: сущности анкеты и ячейки таблицы кредиторов (в равных долях)."""
+    return (entity_accuracy(found, expected) + table_accuracy(text, expected.get(TABLE_KEY, []))) / 2
+
+
+def excel_accuracy(excel_content, expected):
+    """Точность для XLSX: поля анкеты, число строк выписки и ее итоговая сумма."""
+    if not isinstance(excel_content, dict) or "error" in excel_content:
+        return 0.0
+    anketa_rows = excel_content.get("Анкета Клиента") or [{}]
+    statement = excel_content.get("Выписка", [])
+    checks = [str(anketa_rows[0].get(key, "")) == str(value)
+              for key, value in expected.items() if key not in ("statement_rows", "statement_total")]
+    checks.append(len(statement) == expected["statement_rows"])
+    total = round(sum(float(row.get("Сумма, руб.") or 0) for row in statement), 2)
+    checks.append(abs(total - expected["statement_total"]) < 0.01)
+    return sum(checks) / len(checks)
+
+
+# --- Случаи бенчмарка ---
+def run_process_document(entry, path):
+    result = process_document(path)
+    if entry["kind"] == "xlsx_statement":
+        return excel_accuracy(result.get("content"), entry["expected"])
+    if entry["kind"] == "docx_tables":
+        return docx_accuracy(result.get("structured_data", {}), result.get("content", ""), entry["expected"])
+    return entity_accuracy(result.get("structured_data", {}), entry["expected"])
+
+
+def run_extract_text_from_word(entry, path):
+    text = extract_text_from_word(path)
+    return docx_accuracy(simple_ner_from_text(text), text, entry["expected"])
+
+
+def run_extract_data_from_excel(entry, path):
+    return excel_accuracy(extract_data_from_excel(path), entry["expected"])
+
+
+def run_extract_text_from_pdf(entry, path):
+    return entity_accuracy(simple_ner_from_text(extract_text_from_pdf(path)), entry["expected"])
+
+
+def run_extract_text_from_image(entry, path):
+    return entity_accuracy(simple_ner_from_text(extract_text_from_image(path)), entry["expected"])
+
+
+def run_simple_ner_from_text(entry, path):
+    return entity_accuracy(simple_ner_from_text(entry["expected_text"]), entry["expected"])
+
+
+def file_size(entry, path):
+    return os.path.getsize(path)
+
+
+def text_size(entry, path):
+    return len(entry["expected_text"].encode('utf-8'))
+
+
+def build_cases():
+    """Список случаев: (имя, виды документов, функция запуска, размер входных данных одного документа)."""
+    cases = [(f"process_document[{kind}]", [kind], run_process_document, file_size) for kind in ALL_KINDS]
+    cases += [
+        ("extract_text_from_word[docx_tables]", ["docx_tables"], run_extract_text_from_word, file_size),
+        ("extract_data_from_excel[xlsx_statement]", ["xlsx_statement"], run_extract_data_from_excel, file_size),
+    ]
+    cases += [(f"extract_text_from_pdf[{kind}]", [kind], run_extract_text_from_pdf, file_size)
+              for kind in ["pdf_text", "pdf_scan", "pdf_mixed"]]
+    cases += [(f"extract_text_from_image[{kind}]", [kind], run_extract_text_from_image, file_size)
+              for kind in ["scan_png", "scan_jpeg"]]
+    cases.append(("simple_ner_from_text", TEXT_KINDS, run_simple_ner_from_text, text_size))
+    return cases
+
+
+# --- Запуск ---
+def load_corpus(corpus_dir=CORPUS_DIR):
+    """Загружает manifest.json корпуса; если корпуса нет, генерирует его."""
+    manifest_path = os.path.join(corpus_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        print(f"Корпус не найден в {corpus_dir}. Генерация...")
+        return generate_corpus(corpus_dir)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def tesseract_available():
+    """Проверяет, установлен ли Tesseract OCR."""
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def run_case(run_func, entries, corpus_dir, repeat, size_func):
+    """
+    Замеряет один случай: пропускную способность (лучший из repeat замеров без трассировки памяти),
+    пиковую память Python (tracemalloc, отдельный проход) и среднюю точность.
+    Память Tesseract и внутренние буферы OpenCV в пиковую память не входят.
+    """
+    paths = [os.path.join(corpus_dir, entry["file"]) for entry in entries]
+    total_megabytes = sum(size_func(entry, path) for entry, path in zip(entries, paths)) / (1024 * 1024)
+
+    best_seconds = None  # Лучшее время одного прохода по всем документам случая
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            passes = 0
+            start = time.perf_counter()
+            while passes == 0 or time.perf_counter() - start < MIN_SAMPLE_SECONDS:
+                for entry, path in zip(entries, paths):
+                    run_func(entry, path)
+                passes += 1
+            elapsed = (time.perf_counter() - start) / passes
+            best_seconds = elapsed if best_seconds is None else min(best_seconds, elapsed)
+
+        gc.collect()  # Мусор от предыдущих замеров не должен попадать в пик
+        tracemalloc.start()
+        accuracies = [run_func(entry, path) for entry, path in zip(entries, paths)]
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    best_seconds = max(best_seconds, 1e-9)
+    return {
+        "documents": len(entries),
+        "documents_per_second": round(len(entries) / best_seconds, 3),
+        "megabytes_per_second": round(total_megabytes / best_seconds, 3),
+        "peak_memory_mb": round(peak_bytes / (1024 * 1024), 3),
+        "accuracy": round(sum(accuracies) / len(accuracies), 4),
+    }
+
+
+def run_params(manifest, skip_ocr):
+    """Параметры прогона, от которых зависят результаты. С эталоном, снятым при других параметрах, сравнивать нельзя."""
+    return {"seed": manifest.get("seed"), "documents_per_kind": manifest.get("documents_per_kind"),
+            "xlsx_rows": manifest.get("xlsx_rows"), "skip_ocr": skip_ocr}
+
+
+def run_benchmarks(corpus_dir=CORPUS_DIR, repeat=DEFAULT_REPEAT, skip_ocr=False):
+    """
+    Запускает все случаи бенчмарка по корпусу.
+    Возвращает (параметры прогона, словарь {имя случая: метрики}).
+    """
+    manifest = load_corpus(corpus_dir)
+    if not skip_ocr and not tesseract_available():
+        print("Tesseract OCR не найден. Случаи, требующие OCR, пропускаются.")
+        skip_ocr = True
+
+    results = {}
+    for name, kinds, run_func, size_func in build_cases():
+        entries = [entry for entry in manifest["documents"] if entry["kind"] in kinds]
+        if skip_ocr:
+            entries = [entry for entry in entries if entry["kind"] not in OCR_KINDS]
+        if not entries:
+            print(f"{name}: нет документов (пропущено)")
+            continue
+        results[name] = run_case(run_func, entries, corpus_dir, repeat, size_func)
+        metrics = results[name]
+        print(f"{name}: {metrics['documents_per_second']} док/с, {metrics['megabytes_per_second']} МБ/с, "
+              f"пик памяти {metrics['peak_memory_mb']} МБ, точность {metrics['accuracy']}")
+    return run_params(manifest, skip_ocr), results
+
+
+# --- Сравнение с эталонным прогоном ---
+def find_regressions(results, baseline, max_throughput_drop=MAX_THROUGHPUT_DROP,
+                     max_memory_growth=MAX_MEMORY_GROWTH, max_accuracy_drop=MAX_ACCURACY_DROP):
+    """
+    Возвращает список описаний регрессий относительно эталонного прогона.
+    Случай эталона, которого нет в текущем прогоне, и изменившееся число документов тоже считаются регрессией.
+    """
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            regressions.append(f"{name}: случай отсутствует в текущем прогоне")
+            continue
+        if current["documents"] != base["documents"]:
+            regressions.append(f"{name}: документов {current['documents']} (эталон {base['documents']})")
+            continue
+        if current["documents_per_second"] < base["documents_per_second"] * (1 - max_throughput_drop):
+            regressions.append(f"{name}: пропускная способность {current['documents_per_second']} док/с "
+                               f"(эталон {base['documents_per_second']})")
+        if current["peak_memory_mb"] > base["peak_memory_mb"] * (1 + max_memory_growth):
+            regressions.append(f"{name}: пиковая память {current['peak_memory_mb']} МБ "
+                               f"(эталон {base['peak_memory_mb']})")
+        if current["accuracy"] < base["accuracy"] - max_accuracy_drop:
+            regressions.append(f"{name}: точность {current['accuracy']} (эталон {base['accuracy']})")
+    return regressions
+
+
+# --- Основной блок ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Бенчмарк извлечения данных: пропускная способность, пиковая память и точность по синтетическому корпусу.")
+    parser.add_argument("--corpus-dir", default=CORPUS_DIR)
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Файл эталонного прогона.")
+    parser.add_argument("--update-baseline", action="store_true", help="Сохранить текущие результаты как эталон.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--skip-ocr", action="store_true", help="Пропустить случаи, требующие Tesseract.")
+    parser.add_argument("--max-throughput-drop", type=float, default=MAX_THROUGHPUT_DROP)
+    parser.add_argument("--max-memory-growth", type=float, default=MAX_MEMORY_GROWTH)
+    parser.add_argument("--max-accuracy-drop", type=float, default=MAX_ACCURACY_DROP)
+    args = parser.parse_args()
+
+    # Без эталона сравнивать не с чем: проверка не должна молча считаться пройденной
+    if not args.update_baseline and not os.path.exists(args.baseline):
+        print(f"Эталонный прогон {args.baseline} не найден. Запустите с --update-baseline, чтобы создать его.")
+        sys.exit(2)
+
+    params, benchmark_results = run_benchmarks(args.corpus_dir, args.repeat, args.skip_ocr)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({"params": params, "results": benchmark_results}, f, ensure_ascii=False, indent=4)
+        print(f"\nЭталонный прогон сохранен в {args.baseline}")
+        sys.exit(0)
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if "params" not in baseline:
+        print(f"\nЭталон {args.baseline} снят старой версией бенчмарка (без параметров прогона). "
+              f"Пересоздайте его с --update-baseline.")
+        sys.exit(2)
+    # Результаты при другом корпусе или без OCR с эталоном несравнимы
+    mismatched = [f"{key}: {params.get(key)} (эталон {value})"
+                  for key, value in baseline["params"].items() if params.get(key) != value]
+    if mismatched:
+        print("\n--- Параметры прогона не совпадают с эталоном, сравнение невозможно ---")
+        for line in mismatched:
+            print(f"  {line}")
+        sys.exit(2)
+
+    found_regressions = find_regressions(benchmark_results, baseline["results"], args.max_throughput_drop,
+                                         args.max_memory_growth, args.max_accuracy_drop)
+    if found_regressions:
+        print("\n--- Обнаружены регрессии ---")
+        for regression in found_regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nРегрессий не обнаружено.")
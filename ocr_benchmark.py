@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import difflib
+import argparse
+
+try:
+    import resource  # Учет CPU-времени дочерних процессов (Tesseract); недоступен в Windows
+except ImportError:
+    resource = None
+
+from PIL import Image
+
+from corpus_generator import CORPUS_DIR
+from document_formation import (
+    ADAPTIVE_OCR_LOW_SCALE,
+    ADAPTIVE_OCR_MIN_CONFIDENCE,
+    OCR_MODE_SINGLE,
+    adaptive_ocr_image,
+    ocr_page_image,
+)
+from extraction_benchmark import load_corpus, tesseract_available
+
+# Сканы корпуса corpus_generator.py, на которых идет сравнение по умолчанию
+CORPUS_SCAN_KINDS = ["scan_png", "scan_jpeg"]
+
+
+# --- Замер времени ---
+def cpu_seconds():
+    """CPU-время текущего процесса плюс завершившихся дочерних процессов (Tesseract запускается отдельно)."""
+    total = time.process_time()
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def measure(ocr_func, repeat):
+    """Запускает ocr_func repeat раз. Возвращает (текст последнего запуска, среднее время, среднее CPU-время)."""
+    wall_start, cpu_start = time.perf_counter(), cpu_seconds()
+    text = ""
+    for _ in range(repeat):
+        text = ocr_func()
+    return text, (time.perf_counter() - wall_start) / repeat, (cpu_seconds() - cpu_start) / repeat
+
+
+def text_similarity(text, reference):
+    """Доля совпадающих слов (0..1) между распознанным текстом и эталоном."""
+    return difflib.SequenceMatcher(None, text.split(), reference.split()).ratio()
+
+
+# --- Сравнение режимов OCR ---
+def benchmark_image(image_path, repeat=1, low_scale=ADAPTIVE_OCR_LOW_SCALE, min_confidence=ADAPTIVE_OCR_MIN_CONFIDENCE,
+                    recover_missed=True):
+    """
+    Сравнивает одиночный OCR в полном разрешении с адаптивным OCR для одного изображения.
+    Эталоном служит файл <изображение>.gt.txt, если он есть, иначе - результат OCR в полном разрешении
+    (тогда точность одиночного прохода всегда 1.0, а адаптивного - лишь совпадение с ним).
+    """
+    with Image.open(image_path) as image:
+        image.load()
+
+    single_text, single_wall, single_cpu = measure(
+        lambda: ocr_page_image(image, image_path, ocr_mode=OCR_MODE_SINGLE)[0], repeat)
+    adaptive_text, adaptive_wall, adaptive_cpu = measure(
+        lambda: adaptive_ocr_image(image, low_scale, min_confidence, recover_missed)[0], repeat)
+
+    ground_truth_path = image_path + ".gt.txt"
+    has_ground_truth = os.path.exists(ground_truth_path)
+    if has_ground_truth:
+        with open(ground_truth_path, 'r', encoding='utf-8') as f:
+            reference = f.read()
+    else:
+        reference = single_text
+
+    return {
+        "image": image_path,
+        "has_ground_truth": has_ground_truth,
+        "single_wall": single_wall,
+        "single_cpu": single_cpu,
+        "single_accuracy": text_similarity(single_text, reference),
+        "adaptive_wall": adaptive_wall,
+        "adaptive_cpu": adaptive_cpu,
+        "adaptive_accuracy": text_similarity(adaptive_text, reference),
+    }
+
+
+def print_results(results):
+    """Печатает таблицу результатов и итог по всем изображениям."""
+    print("\n--- Сравнение OCR: полное разрешение vs адаптивный ---")
+    print(f"{'Файл':<30} {'CPU, с':>16} {'Время, с':>16} {'Точность':>16}")
+    for r in results:
+        marker = "" if r["has_ground_truth"] else " *"
+        print(f"{os.path.basename(r['image'])[:30]:<30} "
+              f"{r['single_cpu']:>7.2f} / {r['adaptive_cpu']:<6.2f} "
+              f"{r['single_wall']:>7.2f} / {r['adaptive_wall']:<6.2f} "
+              f"{r['single_accuracy']:>7.3f} / {r['adaptive_accuracy']:<6.3f}{marker}")
+    without_ground_truth = sum(1 for r in results if not r["has_ground_truth"])
+    if without_ground_truth:
+        print(f"* Нет эталона <файл>.gt.txt ({without_ground_truth} из {len(results)}): точность посчитана "
+              f"относительно одиночного прохода в полном разрешении, а не относительно настоящего текста.")
+
+    total_single_cpu = sum(r["single_cpu"] for r in results)
+    total_adaptive_cpu = sum(r["adaptive_cpu"] for r in results)
+    mean_single_accuracy = sum(r["single_accuracy"] for r in results) / len(results)
+    mean_adaptive_accuracy = sum(r["adaptive_accuracy"] for r in results) / len(results)
+    print(f"\nCPU-время: {total_single_cpu:.2f} с (полное разрешение) / {total_adaptive_cpu:.2f} с (адаптивный)")
+    if total_adaptive_cpu > 0:
+        print(f"Ускорение по CPU: x{total_single_cpu / total_adaptive_cpu:.2f}")
+    print(f"Средняя точность: {mean_single_accuracy:.3f} (полное разрешение) / {mean_adaptive_accuracy:.3f} (адаптивный)")
+
+
+# --- Основной блок ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Сравнение одиночного OCR в полном разрешении с адаптивным OCR по уверенности Tesseract.")
+    parser.add_argument("images", nargs="*",
+                        help="Сканы (PNG, JPEG, TIFF...). Эталонный текст - <файл>.gt.txt (опционально). "
+                             "По умолчанию - сканы корпуса corpus_generator.py.")
+    parser.add_argument("--corpus-dir", default=CORPUS_DIR, help="Корпус, если сканы не указаны (создается при отсутствии).")
+    parser.add_argument("--repeat", type=int, default=1, help="Сколько раз повторять каждый замер.")
+    parser.add_argument("--low-scale", type=float, default=ADAPTIVE_OCR_LOW_SCALE)
+    parser.add_argument("--min-confidence", type=float, default=ADAPTIVE_OCR_MIN_CONFIDENCE)
+    parser.add_argument("--no-recovery", action="store_true",
+                        help="Не искать текст, пропущенный быстрым проходом (показывает, сколько точности он дает).")
+    args = parser.parse_args()
+
+    if not tesseract_available():
+        print("Tesseract OCR не найден. Установите его (см. README), сравнение невозможно.")
+        sys.exit(1)
+
+    if not args.images:
+        manifest = load_corpus(args.corpus_dir)
+        args.images = [os.path.join(args.corpus_dir, entry["file"]) for entry in manifest["documents"]
+                       if entry["kind"] in CORPUS_SCAN_KINDS]
+        if not args.images:
+            print(f"В корпусе {args.corpus_dir} нет сканов (нужен шрифт с кириллицей, см. CORPUS_FONT_PATH).")
+            sys.exit(1)
+
+    results = [benchmark_image(path, args.repeat, args.low_scale, args.min_confidence, not args.no_recovery)
+               for path in args.images]
+    print_results(results)
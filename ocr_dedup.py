@@ -0,0 +1,271 @@
+import sys
+import time
+import random
+
+import cv2  # OpenCV для шумоподавления и бинаризации
+import numpy as np
+from PIL import Image, ImageOps  # Pillow для работы с изображениями
+
+# --- Константы для сравнения страниц ---
+# Страница приводится к ширине NORMALIZED_WIDTH, очищается от шума и бинаризуется, содержимое
+# сдвигается в левый верхний угол (поля скана и рендера PDF отличаются). Такая маска текста почти
+# не зависит от формата (PNG, JPEG, страница PDF), сжатия и разрешения.
+NORMALIZED_WIDTH = 1600
+MEDIAN_BLUR_SIZE = 3  # Медианный фильтр убирает шум скана до бинаризации
+OPENING_KERNEL_SIZE = 2  # Морфологическое открытие убирает одиночные точки после бинаризации
+
+# Быстрый предварительный отбор: плотность "чернил" по сетке клеток DESCRIPTOR_CELL x DESCRIPTOR_CELL пикселей.
+# Страницы с расстоянием (L1 нормированных плотностей) больше порога дальше не сравниваются.
+DESCRIPTOR_CELL = 32
+MAX_DESCRIPTOR_DISTANCE = 0.25
+
+# Точная проверка: маски сравниваются попиксельно с допуском SHIFT_TOLERANCE пикселей.
+# Несовпадения считаются в окне MISMATCH_WINDOW x MISMATCH_WINDOW (примерно размер символа),
+# берется окно с максимумом. Шум и сжатие дают разрозненные точки, а другой символ - плотное пятно,
+# поэтому страницы, отличающиеся даже одной цифрой, дубликатами не считаются.
+SHIFT_TOLERANCE = 1
+MISMATCH_WINDOW = 40
+# Максимум несовпадающих пикселей в окне для дубликата. На корпусе corpus_generator.py:
+# PNG/JPEG/PDF 300 DPI одной страницы - не более 8, замена одной цифры - от 36, другая анкета - от 276.
+DEFAULT_MAX_MISMATCH = 20
+# ВАЖНО: повторный скан того же листа (другой наклон и шум) дубликатом не считается и распознается заново.
+# Повышая порог, вы рискуете переиспользовать OCR чужого документа.
+
+
+# --- Нормализация и сравнение страниц ---
+def normalize_page(image):
+    """
+    Возвращает бинарную маску текста страницы (numpy bool): EXIF-ориентация, оттенки серого,
+    масштаб к NORMALIZED_WIDTH, медианный фильтр, бинаризация Оцу, морфологическое открытие.
+    Содержимое сдвигается в левый верхний угол, чтобы поля страницы не влияли на сравнение.
+    """
+    gray = np.asarray(ImageOps.exif_transpose(image).convert('L'))
+    height = max(1, round(gray.shape[0] * NORMALIZED_WIDTH / gray.shape[1]))
+    gray = cv2.resize(gray, (NORMALIZED_WIDTH, height), interpolation=cv2.INTER_AREA)
+    gray = cv2.medianBlur(gray, MEDIAN_BLUR_SIZE)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    kernel = np.ones((OPENING_KERNEL_SIZE, OPENING_KERNEL_SIZE), np.uint8)
+    binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+
+    mask = np.zeros(binary.shape, dtype=bool)
+    ys, xs = np.nonzero(binary)
+    if len(ys) == 0:
+        return mask  # Пустая страница
+    content = binary[ys.min():, xs.min():] > 0
+    mask[:content.shape[0], :content.shape[1]] = content
+    return mask
+
+
+def compute_page_descriptor(mask):
+    """Сетка плотности текста (сумма по сетке равна 1) для быстрого предварительного отбора."""
+    rows = max(1, mask.shape[0] // DESCRIPTOR_CELL)
+    cols = max(1, mask.shape[1] // DESCRIPTOR_CELL)
+    grid = cv2.resize(mask.astype(np.float32), (cols, rows), interpolation=cv2.INTER_AREA)
+    return grid / max(float(grid.sum()), 1e-9)
+
+
+def descriptor_distance(descriptor_a, descriptor_b):
+    """L1-расстояние между сетками плотности (0 - совпадают, 2 - не пересекаются)."""
+    rows = max(descriptor_a.shape[0], descriptor_b.shape[0])
+    cols = max(descriptor_a.shape[1], descriptor_b.shape[1])
+    padded_a = np.zeros((rows, cols), np.float32)
+    padded_b = np.zeros((rows, cols), np.float32)
+    padded_a[:descriptor_a.shape[0], :descriptor_a.shape[1]] = descriptor_a
+    padded_b[:descriptor_b.shape[0], :descriptor_b.shape[1]] = descriptor_b
+    return float(np.abs(padded_a - padded_b).sum())
+
+
+def max_local_mismatch(mask_a, mask_b):
+    """
+    Максимальное число несовпадающих пикселей двух масок в окне MISMATCH_WINDOW.
+    Пиксель текста совпадает, если в другой маске есть текст на расстоянии до SHIFT_TOLERANCE пикселей.
+    """
+    rows = max(mask_a.shape[0], mask_b.shape[0])
+    cols = max(mask_a.shape[1], mask_b.shape[1])
+    padded_a = np.zeros((rows, cols), np.uint8)
+    padded_b = np.zeros((rows, cols), np.uint8)
+    padded_a[:mask_a.shape[0], :mask_a.shape[1]] = mask_a
+    padded_b[:mask_b.shape[0], :mask_b.shape[1]] = mask_b
+
+    kernel = np.ones((2 * SHIFT_TOLERANCE + 1, 2 * SHIFT_TOLERANCE + 1), np.uint8)
+    near_a = cv2.dilate(padded_a, kernel)
+    near_b = cv2.dilate(padded_b, kernel)
+    mismatch = ((padded_a & (1 - near_b)) | (padded_b & (1 - near_a))).astype(np.float32)
+    window_sums = cv2.boxFilter(mismatch, -1, (MISMATCH_WINDOW, MISMATCH_WINDOW), normalize=False)
+    return int(round(float(window_sums.max())))
+
+
+# --- Индекс уже распознанных страниц ---
+class OcrDedupIndex:
+    """
+    Индекс уже распознанных страниц.
+    Если новая страница совпадает с одной из уже обработанных в пределах порога,
+    результат OCR берется из индекса вместо повторного запуска Tesseract.
+    """
+
+    def __init__(self, max_mismatch=DEFAULT_MAX_MISMATCH, max_descriptor_distance=MAX_DESCRIPTOR_DISTANCE):
+        self.max_mismatch = max_mismatch
+        self.max_descriptor_distance = max_descriptor_distance
+        self.entries = []  # Список словарей: descriptor, mask (упакованная), shape, result, source, ocr_seconds
+        self.pages_processed = 0
+        self.duplicates_found = 0
+        self.ocr_seconds_spent = 0.0
+        self.ocr_seconds_saved = 0.0
+
+    def find(self, mask, descriptor):
+        """Ищет ранее обработанную страницу, совпадающую с маской в пределах порога. Возвращает запись или None."""
+        candidates = []
+        for entry in self.entries:
+            distance = descriptor_distance(descriptor, entry["descriptor"])
+            if distance <= self.max_descriptor_distance:
+                candidates.append((distance, len(candidates), entry))
+
+        best_entry = None
+        best_mismatch = self.max_mismatch + 1
+        for _, _, entry in sorted(candidates):
+            entry_mask = np.unpackbits(entry["mask"], count=entry["shape"][0] * entry["shape"][1])
+            mismatch = max_local_mismatch(mask, entry_mask.reshape(entry["shape"]).astype(bool))
+            if mismatch < best_mismatch:
+                best_entry = entry
+                best_mismatch = mismatch
+        return best_entry
+
+    def add(self, mask, descriptor, result, source, ocr_seconds):
+        """Добавляет результат OCR страницы в индекс. Маска хранится упакованной (1 бит на пиксель)."""
+        self.entries.append({"descriptor": descriptor, "mask": np.packbits(mask), "shape": mask.shape,
+                             "result": result, "source": source, "ocr_seconds": ocr_seconds})
+
+    def ocr_with_dedup(self, image, source, ocr_func):
+        """
+        Возвращает результат ocr_func(image), переиспользуя ранее полученный результат
+        для почти-дубликатов страницы.
+        """
+        self.pages_processed += 1
+        mask = normalize_page(image)
+        descriptor = compute_page_descriptor(mask)
+        entry = self.find(mask, descriptor)
+        if entry is not None:
+            self.duplicates_found += 1
+            self.ocr_seconds_saved += entry["ocr_seconds"]
+            print(f"Страница {source} совпадает с уже распознанной {entry['source']}. OCR пропущен.")
+            return entry["result"]
+
+        start = time.perf_counter()
+        result = ocr_func(image)
+        ocr_seconds = time.perf_counter() - start
+        self.ocr_seconds_spent += ocr_seconds
+        self.add(mask, descriptor, result, source, ocr_seconds)
+        return result
+
+    def get_stats(self):
+        """Возвращает статистику дедупликации для пакета."""
+        return {
+            "pages_processed": self.pages_processed,
+            "duplicates_found": self.duplicates_found,
+            "ocr_seconds_spent": round(self.ocr_seconds_spent, 3),
+            "ocr_seconds_saved": round(self.ocr_seconds_saved, 3),
+        }
+
+    def print_report(self):
+        """Печатает отчет о найденных дубликатах и сэкономленном времени OCR."""
+        stats = self.get_stats()
+        print("\n--- Дедупликация сканов ---")
+        print(f"  Страниц проверено: {stats['pages_processed']}")
+        print(f"  Найдено дубликатов: {stats['duplicates_found']}")
+        print(f"  Страниц отправлено на OCR: {stats['pages_processed'] - stats['duplicates_found']}")
+        print(f"  Время OCR: {stats['ocr_seconds_spent']:.2f} с, сэкономлено: {stats['ocr_seconds_saved']:.2f} с")
+
+
+# --- Самопроверка порога ---
+def page_mismatch(image_a, image_b):
+    """Сравнивает две страницы так же, как индекс. Возвращает (расстояние сеток, несовпадение в окне)."""
+    mask_a, mask_b = normalize_page(image_a), normalize_page(image_b)
+    distance = descriptor_distance(compute_page_descriptor(mask_a), compute_page_descriptor(mask_b))
+    return distance, max_local_mismatch(mask_a, mask_b)
+
+
+def is_duplicate(distance, mismatch, max_mismatch=DEFAULT_MAX_MISMATCH):
+    return distance <= MAX_DESCRIPTOR_DISTANCE and mismatch <= max_mismatch
+
+
+def check_threshold(pages=6, seed=42):
+    """
+    Проверяет порог на синтетических сканах corpus_generator.py: PNG, JPEG и рендер страницы PDF
+    в 300 DPI одного скана должны считаться дубликатами, а анкеты других людей и анкета
+    с одной измененной цифрой - нет. Возвращает True, если все проверки пройдены.
+    """
+    import io
+    from corpus_generator import find_font_path, generate_person, person_lines, render_scan, scanned_pdf_bytes
+    try:
+        from pdf2image import convert_from_bytes
+    except ImportError:
+        convert_from_bytes = None
+
+    font_path = find_font_path()
+    if font_path is None:
+        print("Шрифт с кириллицей не найден (укажите CORPUS_FONT_PATH). Проверка невозможна.")
+        return False
+
+    def as_jpeg(image, quality=70):
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=quality)
+        return Image.open(io.BytesIO(output.getvalue()))
+
+    def as_pdf_page_300dpi(image):
+        pdf_bytes = scanned_pdf_bytes(image)  # Скан вкладывается в PDF как JPEG с разрешением 200 DPI
+        if convert_from_bytes is not None:
+            try:
+                return convert_from_bytes(pdf_bytes, dpi=300)[0]
+            except Exception as e:
+                print(f"Не удалось отрендерить PDF через pdf2image ({e}). Используется имитация рендера.")
+        # Имитация рендера в 300 DPI: вложенный JPEG (качество Pillow по умолчанию), увеличенный в 1.5 раза
+        return as_jpeg(image, quality=75).resize((image.width * 3 // 2, image.height * 3 // 2), Image.BICUBIC)
+
+    if convert_from_bytes is None:
+        print("pdf2image не установлен: рендер страницы PDF в 300 DPI имитируется увеличением вложенного JPEG.")
+
+    failures = []
+    scans = []
+    for i in range(pages):
+        rng = random.Random(f"{seed}-{i}")
+        lines = person_lines(generate_person(rng))
+        scan_seed = rng.random()
+        scan = render_scan(lines, font_path, random.Random(scan_seed))
+        scans.append(scan)
+
+        for variant_name, variant in (("JPEG", as_jpeg(scan)), ("PDF 300 DPI", as_pdf_page_300dpi(scan))):
+            distance, mismatch = page_mismatch(scan, variant)
+            print(f"Анкета {i}: PNG vs {variant_name}: сетка {distance:.3f}, несовпадение {mismatch}")
+            if not is_duplicate(distance, mismatch):
+                failures.append(f"анкета {i}: {variant_name} не распознан как дубликат")
+
+        # Та же анкета с одной измененной цифрой и тем же шумом скана
+        digit_positions = [(row, col) for row, line in enumerate(lines) for col, char in enumerate(line) if char.isdigit()]
+        row, col = rng.choice(digit_positions)
+        changed_lines = list(lines)
+        changed_digit = str((int(lines[row][col]) + rng.randint(1, 9)) % 10)
+        changed_lines[row] = lines[row][:col] + changed_digit + lines[row][col + 1:]
+        changed_scan = render_scan(changed_lines, font_path, random.Random(scan_seed))
+        distance, mismatch = page_mismatch(scan, changed_scan)
+        print(f"Анкета {i}: замена одной цифры: сетка {distance:.3f}, несовпадение {mismatch}")
+        if is_duplicate(distance, mismatch):
+            failures.append(f"анкета {i}: замена одной цифры принята за дубликат")
+
+    for i in range(len(scans)):
+        for j in range(i + 1, len(scans)):
+            distance, mismatch = page_mismatch(scans[i], scans[j])
+            if is_duplicate(distance, mismatch):
+                failures.append(f"анкеты {i} и {j} приняты за дубликаты")
+
+    if failures:
+        print("\n--- Проверка порога не пройдена ---")
+        for failure in failures:
+            print(f"  {failure}")
+        return False
+    print(f"\nПроверка порога пройдена: {pages} анкет, порог несовпадения {DEFAULT_MAX_MISMATCH}.")
+    return True
+
+
+# --- Основной блок ---
+if __name__ == "__main__":
+    sys.exit(0 if check_threshold() else 1)